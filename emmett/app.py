@@ -12,7 +12,7 @@ Provides the central application object.
 from __future__ import annotations
 
 import os
-from typing import Any, Dict, List, Optional, Type, Union
+from typing import Any, Callable, Dict, List, Optional, Type, Union
 
 import click
 from emmett_core._internal import create_missing_app_folders, get_root_path
@@ -20,7 +20,12 @@ from emmett_core.app import App as _App, AppModule as _AppModule, AppModuleGroup
 from emmett_core.routing.cache import RouteCacheRule
 from yaml import SafeLoader as ymlLoader, load as ymlload
 
-from .asgi.handlers import HTTPHandler as ASGIHTTPHandler, WSHandler as ASGIWSHandler
+from .asgi.handlers import (
+    HTTPHandler as ASGIHTTPHandler,
+    LifeSpanHandler as ASGILifeSpanHandler,
+    WSHandler as ASGIWSHandler,
+)
+from .cache import Cache, CacheHandler
 from .ctx import current
 from .extensions import Signals
 from .helpers import load_component
@@ -31,6 +36,7 @@ from .pipeline import Injector, Pipe
 from .routing.router import HTTPRouter, RoutingCtx, RoutingCtxGroup, WebsocketRouter
 from .routing.urls import url
 from .rsgi.handlers import HTTPHandler as RSGIHTTPHandler, WSHandler as RSGIWSHandler
+from .static import StaticManifest, scan_static_sidecars
 from .templating.templater import Templater
 from .testing import EmmettTestClient
 from .utils import dict_to_sdict, read_file
@@ -45,6 +51,13 @@ class Config(_Config):
         self._templates_encoding = "utf8"
         self._templates_escape = "common"
         self._templates_indent = False
+        self._templates_cache = None
+        self.templates_bundle = "templates.bundle"
+        self.templates_awaits = False
+        self.templates_concurrent_awaits = False
+        self.static_manifest = "static_manifest.json"
+        self.static_precompressed = True
+        self.metrics_endpoint = False
 
     @property
     def templates_auto_reload(self) -> bool:
@@ -82,6 +95,15 @@ class Config(_Config):
         self._templates_adjust_indent = value
         self._app.templater._set_indent(value)
 
+    @property
+    def templates_cache(self) -> Optional[Union[Cache, CacheHandler]]:
+        return self._templates_cache
+
+    @templates_cache.setter
+    def templates_cache(self, value: Optional[Union[Cache, CacheHandler]]):
+        self._templates_cache = value
+        self._app.templater._set_cache(value)
+
 
 class AppModule(_AppModule):
     @classmethod
@@ -305,7 +327,16 @@ class AppModule(_AppModule):
 
 
 class App(_App):
-    __slots__ = ["cli", "template_default_extension", "template_path", "templater", "translator"]
+    __slots__ = [
+        "_metrics",
+        "cli",
+        "static_manifest",
+        "static_sidecars",
+        "template_default_extension",
+        "template_path",
+        "templater",
+        "translator",
+    ]
 
     config_class = Config
     modules_class = AppModule
@@ -342,6 +373,13 @@ class App(_App):
             adjust_indent=self.config.templates_adjust_indent,
             reload=self.config.templates_auto_reload,
         )
+        self.templater.register_globals(current=current, url=url, asis=asis, load_component=load_component)
+        self._metrics: Dict[str, Callable[[], Dict[str, Any]]] = {}
+        self.static_manifest = StaticManifest()
+        self.static_sidecars: Dict[str, Dict[str, str]] = {}
+        self._extensions_listeners[str(Signals.after_loop)].append(self._load_static_manifest)
+        self._extensions_listeners[str(Signals.after_loop)].append(self._load_static_sidecars)
+        self._extensions_listeners[str(Signals.after_loop)].append(self._load_templates_bundle)
 
     def _configure_paths(self, root_path, opts):
         if root_path is None:
@@ -357,6 +395,7 @@ class App(_App):
         self._router_ws = WebsocketRouter(self, current, url_prefix=url_prefix)
 
     def _init_handlers(self):
+        self._asgi_handlers["lifespan"] = ASGILifeSpanHandler(self, current)
         self._asgi_handlers["http"] = ASGIHTTPHandler(self, current)
         self._asgi_handlers["ws"] = ASGIWSHandler(self, current)
         self._rsgi_handlers["http"] = RSGIHTTPHandler(self, current)
@@ -397,6 +436,7 @@ class App(_App):
         template_path: Optional[str] = None,
         cache: Optional[RouteCacheRule] = None,
         output: str = "auto",
+        template_globals: Optional[Dict[str, Any]] = None,
     ) -> RoutingCtx:
         if callable(paths):
             raise SyntaxError("Use @route(), not @route.")
@@ -414,6 +454,7 @@ class App(_App):
             template_path=template_path,
             cache=cache,
             output=output,
+            template_globals=template_globals,
         )
 
     @property
@@ -429,8 +470,39 @@ class App(_App):
         return context
 
     def render_template(self, filename: str) -> str:
-        ctx = {"current": current, "url": url, "asis": asis, "load_component": load_component}
-        return self.templater.render(filename, ctx)
+        return self.templater.render(filename, {})
+
+    @property
+    def templates_bundle_path(self) -> Optional[str]:
+        if not self.config.templates_bundle:
+            return None
+        return os.path.join(self.root_path, self.config.templates_bundle)
+
+    def _load_templates_bundle(self, *args, **kwargs):
+        file_path = self.templates_bundle_path
+        if file_path and os.path.isfile(file_path):
+            self.templater.load_bundle(file_path, self.static_manifest.digest())
+
+    @property
+    def static_manifest_path(self) -> Optional[str]:
+        if not self.config.static_manifest:
+            return None
+        return os.path.join(self.root_path, self.config.static_manifest)
+
+    def _load_static_manifest(self, *args, **kwargs):
+        file_path = self.static_manifest_path
+        if file_path and os.path.isfile(file_path):
+            self.static_manifest = StaticManifest.load(file_path, self.static_path)
+
+    def _load_static_sidecars(self, *args, **kwargs):
+        if self.config.static_precompressed and os.path.isdir(self.static_path):
+            self.static_sidecars = scan_static_sidecars(self.static_path)
+
+    def register_metrics(self, name: str, provider: Callable[[], Dict[str, Any]]):
+        self._metrics[name] = provider
+
+    def metrics(self) -> Dict[str, Any]:
+        return {name: provider() for name, provider in self._metrics.items()}
 
     def config_from_yaml(self, filename: str, namespace: Optional[str] = None):
         #: import configuration from yaml files
@@ -444,6 +516,9 @@ class App(_App):
     def use_template_extension(self, ext_cls, **config):
         return self.templater.use_extension(ext_cls, **config)
 
+    def __rsgi_del__(self, loop):
+        self.send_signal(Signals.before_shutdown, loop=loop)
+
     def module(
         self,
         import_name: str,
@@ -11,21 +11,44 @@ Provides ASGI handlers.
 
 from __future__ import annotations
 
-from hashlib import md5
-from importlib import resources
-from typing import Awaitable, Callable
-
-from emmett_core.http.response import HTTPBytesResponse, HTTPResponse, HTTPStringResponse
-from emmett_core.protocols.asgi.handlers import HTTPHandler as _HTTPHandler, RequestCancelled, WSHandler as _WSHandler
-from emmett_core.protocols.asgi.typing import Receive, Scope, Send
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+from emmett_core.http.response import HTTPBytesResponse, HTTPFileResponse, HTTPResponse, HTTPStringResponse
+from emmett_core.protocols.asgi.handlers import (
+    Handler,
+    HTTPHandler as _HTTPHandler,
+    LifeSpanHandler as _LifeSpanHandler,
+    RequestCancelled,
+    WSHandler as _WSHandler,
+)
+from emmett_core.protocols.asgi.typing import Event, Receive, Scope, Send
 from emmett_core.utils import cachedprop
 
 from ..ctx import RequestContext, WSContext, current
 from ..debug import debug_handler, smart_traceback
-from ..libs.contenttype import contenttype
+from ..extensions import Signals
+from ..serializers import Serializers
+from ..static import InternalAsset, etag_matches, internal_assets, resolve_static_file
 from .wrappers import Request, Response, Websocket
 
 
+def _scope_header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class LifeSpanHandler(_LifeSpanHandler):
+    __slots__ = []
+
+    @Handler.on_event("lifespan.shutdown")
+    async def event_shutdown(self, scope: Scope, receive: Receive, send: Send, event: Event):
+        self.app.send_signal(Signals.before_shutdown, loop=asyncio.get_event_loop())
+        await send({"type": "lifespan.shutdown.complete"})
+
+
 class HTTPHandler(_HTTPHandler):
     __slots__ = []
     wrapper_cls = Request
@@ -35,17 +58,17 @@ class HTTPHandler(_HTTPHandler):
     def error_handler(self) -> Callable[[], Awaitable[str]]:
         return self._debug_handler if self.app.debug else self.exception_handler
 
-    async def _static_content(self, content: bytes, content_type: str) -> HTTPBytesResponse:
-        content_len = str(len(content))
+    async def _internal_asset_response(self, asset: InternalAsset, if_none_match: Optional[str]) -> HTTPResponse:
+        if etag_matches(if_none_match, asset.etag):
+            return HTTPResponse(304, headers=asset.headers_not_modified)
+        return HTTPBytesResponse(200, asset.content, headers=asset.headers)
+
+    async def _metrics_response(self) -> HTTPBytesResponse:
+        content = Serializers.get_for("json")(self.app.metrics())
         return HTTPBytesResponse(
             200,
-            content,
-            headers={
-                "content-type": content_type,
-                "content-length": content_len,
-                "last-modified": self._internal_assets_md[1],
-                "etag": md5(f"{self._internal_assets_md[0]}_{content_len}".encode("utf8")).hexdigest(),
-            },
+            content.encode("utf8") if isinstance(content, str) else content,
+            headers={"content-type": "application/json", "cache-control": "no-store"},
         )
 
     def _static_handler(self, scope: Scope, receive: Receive, send: Send) -> Awaitable[HTTPResponse]:
@@ -53,17 +76,22 @@ class HTTPHandler(_HTTPHandler):
         #: handle internal assets
         if path.startswith("/__emmett__"):
             file_name = path[12:]
-            if not file_name or file_name.endswith(".html"):
-                return self._http_response(404)
-            pkg = None
-            if "/" in file_name:
-                pkg, file_name = file_name.split("/", 1)
-            try:
-                file_contents = resources.read_binary(f"emmett.assets.{pkg}" if pkg else "emmett.assets", file_name)
-            except FileNotFoundError:
+            if file_name == "metrics" and self.app.config.metrics_endpoint:
+                return self._metrics_response()
+            asset = internal_assets().get(file_name)
+            if asset is None:
                 return self._http_response(404)
-            return self._static_content(file_contents, contenttype(file_name))
-        return super()._static_handler(scope, receive, send)
+            return self._internal_asset_response(asset, _scope_header(scope, b"if-none-match"))
+        #: handle app assets
+        static_file, _ = self.static_matcher(path)
+        if static_file:
+            return self._static_app_response(
+                *resolve_static_file(self.app, static_file, _scope_header(scope, b"accept-encoding"))
+            )
+        return self.dynamic_handler(scope, receive, send)
+
+    async def _static_app_response(self, file_path: str, headers: Dict[str, str]) -> HTTPFileResponse:
+        return HTTPFileResponse(file_path, headers=headers)
 
     async def _debug_handler(self) -> str:
         current.response.headers._data["content-type"] = "text/html; charset=utf-8"
@@ -11,33 +11,1096 @@ Provides a caching system.
 
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import math
+import mmap
 import os
 import pickle
+import random
+import sqlite3
+import struct
 import tempfile
 import threading
 import time
-from typing import Any, List, Optional
+import zlib
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Generator, List, Optional, Set, Tuple, Union
+from uuid import uuid4
 
-from emmett_core.cache import Cache as Cache
-from emmett_core.cache.handlers import CacheHandler, RamCache as RamCache, RedisCache as RedisCache
+from emmett_core.cache import Cache as _Cache
+from emmett_core.cache.handlers import (
+    CacheHandler as _CacheHandler,
+    RamCache as _RamCache,
+    RamElement,
+    RedisCache as _RedisCache,
+)
+from emmett_core.typing import T
+from emmett_core.utils import cachedprop
 
 from ._shortcuts import hashlib_sha1
 from .ctx import current
 from .libs.portalocker import LockedFile
+from .parsers import Parsers
+from .serializers import Serializers
+from .utils import Histogram
+
+
+class CacheLock:
+    interval = 0.05
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+
+    def acquire(self) -> bool:
+        raise NotImplementedError
+
+    def release(self):
+        raise NotImplementedError
+
+    def wait(self) -> bool:
+        deadline = time.monotonic() + self.timeout
+        while not self.acquire():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.interval)
+        return True
+
+    async def wait_loop(self) -> bool:
+        deadline = time.monotonic() + self.timeout
+        while not self.acquire():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.interval)
+        return True
+
+
+class FileCacheLock(CacheLock):
+    def __init__(self, path: str, timeout: float):
+        super().__init__(timeout)
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> bool:
+        import fcntl
+
+        f = open(self.path, "a+b")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        import fcntl
+
+        if self._file is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class RedisCacheLock(CacheLock):
+    def __init__(self, lock: Any, timeout: float):
+        super().__init__(timeout)
+        self._lock = lock
+
+    def acquire(self) -> bool:
+        return self._lock.acquire(blocking=False)
+
+    def release(self):
+        try:
+            self._lock.release()
+        except Exception:
+            pass
+
+
+class CacheEntry:
+    #: envelope for values stored with stale-while-revalidate policies
+    __slots__ = ("value", "expiration", "delta")
+
+    def __init__(self, value: Any, expiration: float, delta: float):
+        self.value = value
+        self.expiration = expiration
+        self.delta = delta
+
+    def __getstate__(self):
+        return (self.value, self.expiration, self.delta)
+
+    def __setstate__(self, state):
+        self.value, self.expiration, self.delta = state
+
+    def is_fresh(self, now: float, early_beta: float = 0) -> bool:
+        #: XFetch: recompute in advance with a probability growing close to expiration
+        if early_beta:
+            now -= self.delta * early_beta * math.log(1.0 - random.random())  # noqa: S311
+        return now < self.expiration
+
+
+class CacheCodec:
+    #: encoded values: magic, serializer and compressor ids followed by the payload
+    _header = struct.Struct("<2sBB")
+    _magic = b"EC"
+    _serializers = {"pickle": 0, "json": 1, "msgpack": 2}
+    _compressors = {None: 0, "zlib": 1, "lz4": 2}
+    #: flags payloads storing a `CacheEntry` as a (value, expiration, delta) list
+    _entry_flag = 0x80
+
+    def __init__(self, serializer: str = "pickle", compression: Optional[str] = None, compress_threshold: int = 1024):
+        if serializer not in self._serializers:
+            raise RuntimeError(f"unsupported cache serializer {serializer}")
+        if compression not in self._compressors:
+            raise RuntimeError(f"unsupported cache compression {compression}")
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self._dumps = self._get_dumper(serializer)
+        self._compress = self._get_compressor(compression)
+
+    @staticmethod
+    def _import_msgpack() -> Any:
+        try:
+            import msgpack
+        except ImportError:
+            raise RuntimeError("no msgpack module found")
+        return msgpack
+
+    @staticmethod
+    def _import_lz4() -> Any:
+        try:
+            import lz4.frame
+        except ImportError:
+            raise RuntimeError("no lz4 module found")
+        return lz4.frame
+
+    def _get_dumper(self, serializer: str) -> Callable[[Any], bytes]:
+        if serializer == "pickle":
+            return lambda value: pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if serializer == "msgpack":
+            return self._import_msgpack().packb
+        dumps = Serializers.get_for(serializer)
+
+        def dumper(value: Any) -> bytes:
+            rv = dumps(value)
+            return rv.encode("utf8") if isinstance(rv, str) else rv
+
+        return dumper
+
+    def _get_loader(self, serializer: int) -> Callable[[bytes], Any]:
+        if serializer == self._serializers["pickle"]:
+            return pickle.loads
+        if serializer == self._serializers["msgpack"]:
+            return self._import_msgpack().unpackb
+        loads = Parsers.get_for("json")
+        return lambda data: loads(bytes(data))
+
+    def _get_compressor(self, compression: Optional[str]) -> Optional[Callable[[bytes], bytes]]:
+        if compression == "zlib":
+            return zlib.compress
+        if compression == "lz4":
+            return self._import_lz4().compress
+        return None
+
+    def _get_decompressor(self, compression: int) -> Callable[[bytes], bytes]:
+        if compression == self._compressors["zlib"]:
+            return zlib.decompress
+        return self._import_lz4().decompress
+
+    @classmethod
+    def is_encoded(cls, data: bytes) -> bool:
+        return data[:2] == cls._magic
+
+    def dumps(self, value: Any) -> bytes:
+        flags = 0
+        if isinstance(value, CacheEntry):
+            value, flags = [value.value, value.expiration, value.delta], self._entry_flag
+        data = self._dumps(value)
+        compression = None
+        if self._compress is not None and len(data) >= self.compress_threshold:
+            data = self._compress(data)
+            compression = self.compression
+        header = self._header.pack(
+            self._magic, self._serializers[self.serializer], self._compressors[compression] | flags
+        )
+        return header + data
+
+    def loads(self, data: bytes) -> Any:
+        #: entries carry their own codec, so changing configuration keeps them readable
+        _, serializer, compression = self._header.unpack_from(data)
+        flags, compression = compression & self._entry_flag, compression & ~self._entry_flag
+        payload = memoryview(data)[self._header.size :]
+        if compression:
+            payload = self._get_decompressor(compression)(payload)
+        rv = self._get_loader(serializer)(payload)
+        return CacheEntry(*rv) if flags else rv
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.sets = 0
+            self.evictions = 0
+            self.expirations = 0
+            self.drops = 0
+            self.refresh_errors = 0
+            self.get_latency = Histogram()
+            self.set_latency = Histogram()
+
+    def record_get(self, hits: int, misses: int, elapsed: float):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.get_latency.observe(elapsed)
+
+    def record_set(self, count: int, elapsed: float):
+        with self._lock:
+            self.sets += count
+            self.set_latency.observe(elapsed)
+
+    def record_evictions(self, count: int = 1):
+        with self._lock:
+            self.evictions += count
+
+    def record_expirations(self, count: int = 1):
+        with self._lock:
+            self.expirations += count
+
+    def record_drops(self, count: int = 1):
+        with self._lock:
+            self.drops += count
+
+    def record_refresh_errors(self, count: int = 1):
+        with self._lock:
+            self.refresh_errors += count
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "sets": self.sets,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "drops": self.drops,
+                "refresh_errors": self.refresh_errors,
+                "get_latency": self.get_latency.as_dict(),
+                "set_latency": self.set_latency.as_dict(),
+            }
+
+
+class CacheHandler(_CacheHandler):
+    _flights_guard = threading.Lock()
+
+    @cachedprop
+    def _flights(self) -> Dict[str, asyncio.Future]:
+        return {}
+
+    @cachedprop
+    def _flights_sync(self) -> Dict[str, List[Any]]:
+        return {}
+
+    @cachedprop
+    def _refreshes(self) -> Dict[str, Any]:
+        return {}
+
+    @cachedprop
+    def _stats(self) -> CacheStats:
+        return CacheStats()
+
+    @contextmanager
+    def _sync_flight(self, key: str) -> Generator[None, None, None]:
+        with self._flights_guard:
+            #: re-entrant, so loaders can read the key they are computing
+            flight = self._flights_sync.setdefault(key, [threading.RLock(), 0])
+            flight[1] += 1
+        try:
+            with flight[0]:
+                yield
+        finally:
+            with self._flights_guard:
+                flight[1] -= 1
+                if not flight[1]:
+                    del self._flights_sync[key]
+
+    @staticmethod
+    def _convert_duration_(method: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(method)
+        def wrap(self, key: str, value: Any, duration: Union[int, str, None] = "default", **kwargs) -> Any:
+            if duration is None:
+                duration = 60 * 60 * 24 * 365
+            if duration == "default":
+                duration = self._default_expire
+            now = time.time()
+            return method(self, key, value, now=now, duration=duration, expiration=now + duration, **kwargs)
+
+        return wrap
+
+    @staticmethod
+    def _track_get_(method: Callable[..., Any]) -> Callable[..., Any]:
+        #: public reads never expose the stale-while-revalidate envelopes
+        @wraps(method)
+        def wrap(self, key: str) -> Any:
+            rv = self._get_tracked(method, key)
+            return rv.value if isinstance(rv, CacheEntry) else rv
+
+        wrap._entries_ = method  # type: ignore
+        return wrap
+
+    @staticmethod
+    def _track_get_many_(method: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(method)
+        def wrap(self, keys: List[str]) -> Dict[str, Any]:
+            rv = self._get_many_tracked(method, keys)
+            return {key: value.value if isinstance(value, CacheEntry) else value for key, value in rv.items()}
+
+        wrap._entries_ = method  # type: ignore
+        return wrap
+
+    def _get_tracked(self, method: Callable[..., Any], key: str) -> Any:
+        start = time.perf_counter()
+        rv = method(self, key)
+        self._stats.record_get(rv is not None, rv is None, time.perf_counter() - start)
+        return rv
+
+    def _get_many_tracked(self, method: Callable[..., Any], keys: List[str]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        rv = method(self, keys)
+        self._stats.record_get(len(rv), len(keys) - len(rv), time.perf_counter() - start)
+        return rv
+
+    def _get_entry(self, key: str) -> Any:
+        #: like `get`, but keeps `CacheEntry` envelopes
+        method = getattr(self.__class__.get, "_entries_", None)
+        if method is None:
+            return self.get(key)
+        return self._get_tracked(method, key)
+
+    def _get_many_entries(self, keys: List[str]) -> Dict[str, Any]:
+        method = getattr(self.__class__.get_many, "_entries_", None)
+        if method is None:
+            return self.get_many(keys)
+        return self._get_many_tracked(method, keys)
+
+    @staticmethod
+    def _track_set_(method: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(method)
+        def wrap(self, key: str, *args, **kwargs) -> Any:
+            start = time.perf_counter()
+            rv = method(self, key, *args, **kwargs)
+            self._stats.record_set(1, time.perf_counter() - start)
+            return rv
+
+        return wrap
+
+    @staticmethod
+    def _track_set_many_(method: Callable[..., Any]) -> Callable[..., Any]:
+        @wraps(method)
+        def wrap(self, mapping: Dict[str, Any], *args, **kwargs) -> Any:
+            start = time.perf_counter()
+            rv = method(self, mapping, *args, **kwargs)
+            self._stats.record_set(len(mapping), time.perf_counter() - start)
+            return rv
+
+        return wrap
+
+    def _duration(self, duration: Union[int, str, None]) -> int:
+        if duration is None:
+            return 60 * 60 * 24 * 365
+        if duration == "default":
+            return self._default_expire
+        return duration  # type: ignore
+
+    def _process_lock(self, key: str) -> Optional[CacheLock]:
+        return None
+
+    def _set(self, key: str, value: Any, duration: Union[int, str, None], tags: Optional[List[str]]):
+        if tags:
+            self.set(key, value, duration, tags=tags)  # type: ignore
+        else:
+            self.set(key, value, duration)
+
+    def _stale_durations(self, duration: Union[int, str, None], stale_ttl: int) -> Tuple[int, int]:
+        duration = self._duration(duration)
+        return duration, duration + stale_ttl
+
+    def _load_sync(
+        self,
+        key: str,
+        function: Callable[[], T],
+        duration: Union[int, str, None],
+        tags: Optional[List[str]],
+        reload: bool,
+    ) -> T:
+        #: only one thread computes the value, the others wait for it
+        with self._sync_flight(key):
+            value = self.get(key) if reload else None
+            if value is not None:
+                return value
+            lock = self._process_lock(key)
+            locked = lock.wait() if lock is not None else False
+            try:
+                value = self.get(key) if locked and reload else None
+                if value is None:
+                    value = function()
+                    self._set(key, value, duration, tags)
+            finally:
+                if locked:
+                    lock.release()  # type: ignore
+        return value
+
+    def _refresh_failed(self, key: str):
+        #: stale values keep being served, so failures would go unnoticed otherwise
+        self._stats.record_refresh_errors()
+        app = getattr(current, "app", None)
+        if app is not None:
+            app.log.exception(f"Cache refresh of key {key} failed")
+
+    def _refresh_sync(
+        self, key: str, function: Callable[[], T], duration: Union[int, str, None], tags: Optional[List[str]]
+    ):
+        try:
+            self._load_sync(key, function, duration, tags, reload=False)
+        except Exception:
+            self._refresh_failed(key)
+        finally:
+            self._refreshes.pop(key, None)
+
+    def _schedule_refresh_sync(
+        self, key: str, function: Callable[[], T], duration: Union[int, str, None], tags: Optional[List[str]]
+    ):
+        with self._flights_guard:
+            if key in self._refreshes:
+                return
+            self._refreshes[key] = True
+        #: loaders might rely on the current context, like the request or the database connection
+        ctx = contextvars.copy_context()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            threading.Thread(
+                target=ctx.run, args=(self._refresh_sync, key, function, duration, tags), daemon=True
+            ).start()
+        else:
+            loop.run_in_executor(None, ctx.run, self._refresh_sync, key, function, duration, tags)
+
+    def get_or_set(
+        self,
+        key: str,
+        function: Callable[[], T],
+        duration: Union[int, str, None] = "default",
+        stale_ttl: int = 0,
+        early_beta: float = 0,
+        tags: Optional[List[str]] = None,
+    ) -> T:
+        value = self._get_entry(key)
+        if not stale_ttl and not early_beta:
+            if value is not None:
+                return value.value if isinstance(value, CacheEntry) else value
+            return self._load_sync(key, function, duration, tags, reload=True)
+        soft, hard = self._stale_durations(duration, stale_ttl)
+
+        def load() -> CacheEntry:
+            start = time.perf_counter()
+            value = function()
+            return CacheEntry(value, time.time() + soft, time.perf_counter() - start)
+
+        if isinstance(value, CacheEntry):
+            if not value.is_fresh(time.time(), early_beta):
+                #: serve the stale value and refresh it in a separate thread
+                self._schedule_refresh_sync(key, load, hard, tags)
+            return value.value
+        value = self._load_sync(key, load, hard, tags, reload=True)
+        return value.value if isinstance(value, CacheEntry) else value
+
+    async def _load_loop(
+        self,
+        key: str,
+        function: Callable[[], T],
+        duration: Union[int, str, None],
+        tags: Optional[List[str]],
+        reload: bool,
+    ) -> T:
+        lock = self._process_lock(key)
+        locked = await lock.wait_loop() if lock is not None else False
+        try:
+            value = self.get(key) if locked and reload else None
+            if value is None:
+                value = await function()  # type: ignore
+                self._set(key, value, duration, tags)
+        finally:
+            if locked:
+                lock.release()  # type: ignore
+        return value
+
+    async def _flight_loop(
+        self,
+        key: str,
+        function: Callable[[], T],
+        duration: Union[int, str, None],
+        tags: Optional[List[str]],
+        reload: bool = True,
+    ) -> T:
+        #: concurrent misses wait for the result of the first one
+        while key in self._flights:
+            flight = self._flights[key]
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                if not flight.cancelled():
+                    raise
+        flight = self._flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._load_loop(key, function, duration, tags, reload)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as exc:
+            flight.set_exception(exc)
+            flight.exception()
+            raise
+        else:
+            flight.set_result(value)
+        finally:
+            del self._flights[key]
+        return value
+
+    async def _refresh_loop(
+        self, key: str, function: Callable[[], T], duration: Union[int, str, None], tags: Optional[List[str]]
+    ):
+        try:
+            await self._flight_loop(key, function, duration, tags, reload=False)
+        except Exception:
+            self._refresh_failed(key)
+        finally:
+            self._refreshes.pop(key, None)
+
+    async def get_or_set_loop(
+        self,
+        key: str,
+        function: Callable[[], T],
+        duration: Union[int, str, None] = "default",
+        stale_ttl: int = 0,
+        early_beta: float = 0,
+        tags: Optional[List[str]] = None,
+    ) -> T:
+        value = self._get_entry(key)
+        if not stale_ttl and not early_beta:
+            if value is not None:
+                return value.value if isinstance(value, CacheEntry) else value
+            return await self._flight_loop(key, function, duration, tags)
+        soft, hard = self._stale_durations(duration, stale_ttl)
+
+        async def load() -> CacheEntry:
+            start = time.perf_counter()
+            value = await function()  # type: ignore
+            return CacheEntry(value, time.time() + soft, time.perf_counter() - start)
+
+        if isinstance(value, CacheEntry):
+            if not value.is_fresh(time.time(), early_beta) and key not in self._refreshes and key not in self._flights:
+                #: serve the stale value and refresh it in background
+                self._refreshes[key] = asyncio.ensure_future(self._refresh_loop(key, load, hard, tags))
+            return value.value
+        value = await self._flight_loop(key, load, hard, tags)
+        return value.value if isinstance(value, CacheEntry) else value
+
+    def stats(self) -> Dict[str, Any]:
+        return self._stats.as_dict()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        rv = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                rv[key] = value
+        return rv
+
+    def set_many(
+        self, mapping: Dict[str, Any], duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None
+    ):
+        for key, value in mapping.items():
+            self._set(key, value, duration, tags)
+
+    def delete_many(self, keys: List[str]):
+        for key in keys:
+            self.clear(key)
+
+    def clear_tags(self, *tags: str):
+        raise NotImplementedError(f"{self.__class__.__name__} doesn't support tags")
+
+    def clear_tags_on_commit(self, model: Any, *tags: str, row_tags: Optional[Callable[[Any], List[str]]] = None):
+        #: `save` and `destroy` always come together with the underlying `insert`, `update`
+        #  or `delete` operation, so static tags are cleared on the latter (which also covers
+        #  bulk operations on sets) and record tags on the former, where the record is available
+        def clear_static(ctx):
+            if tags:
+                self.clear_tags(*tags)
+
+        def clear_row(ctx):
+            if row_tags is None or ctx.row is None:
+                return
+            targets = row_tags(ctx.row)
+            if targets:
+                self.clear_tags(*targets)
+
+        table = model.table
+        for op, callback in (
+            ("insert", clear_static),
+            ("update", clear_static),
+            ("delete", clear_static),
+            ("save", clear_row),
+            ("destroy", clear_row),
+        ):
+            getattr(table, f"_after_commit_{op}").append(callback)
+            #: tables cache the presence of commit callbacks on first use
+            table.__dict__.pop(f"_has_commit_{op}_callbacks", None)
+
+
+class RamCache(CacheHandler, _RamCache):
+    @cachedprop
+    def _tags(self) -> Dict[str, Set[str]]:
+        #: maps tags to prefixed keys
+        return {}
+
+    @cachedprop
+    def _key_tags(self) -> Dict[str, Set[str]]:
+        #: maps prefixed keys to their tags, to keep the tags index in sync with data
+        return {}
+
+    def _tag(self, rkey: str, tags: Optional[List[str]]):
+        self._untag(rkey)
+        if tags:
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(rkey)
+            self._key_tags[rkey] = set(tags)
+
+    def _untag(self, rkey: str):
+        for tag in self._key_tags.pop(rkey, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(rkey)
+                if not keys:
+                    del self._tags[tag]
+
+    def _remove(self, rkey: str):
+        element = self.data.pop(rkey, None)
+        if element is not None:
+            self._heap_acc.remove((element.acc, rkey))
+            self._heap_exp.remove((element.exp, rkey))
+        self._untag(rkey)
+
+    def _prune(self, now):
+        #: remove expired items
+        while self._heap_exp:
+            exp, rk = self._heap_exp[0]
+            if exp >= now:
+                break
+            self._heap_exp.remove((exp, rk))
+            element = self.data.get(rk)
+            if element and element.exp == exp:
+                self._heap_acc.remove((self.data[rk].acc, rk))
+                del self.data[rk]
+                self._untag(rk)
+                self._stats.record_expirations()
+        #: remove threshold exceding elements
+        while len(self.data) > self._threshold:
+            rk = heapq.heappop(self._heap_acc)[1]
+            element = self.data.get(rk)
+            if element:
+                self._heap_exp.remove((element.exp, rk))
+                del self.data[rk]
+                self._untag(rk)
+                self._stats.record_evictions()
+
+    @CacheHandler._track_get_
+    def get(self, key: str) -> Any:
+        return super().get(key)
+
+    @CacheHandler._track_set_
+    def set(self, key: str, value: Any, duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None):
+        with self.lock:
+            #: drop the heaps entries of the replaced element, so they can't evict the new one
+            self._remove(self._prefix + key)
+            super().set(key, value, duration)
+            self._tag(self._prefix + key, tags)
+
+    def clear(self, key: Optional[str] = None):
+        with self.lock:
+            if key is not None:
+                self._remove(self._prefix + key)
+                return
+            super().clear()
+            self._tags.clear()
+            self._key_tags.clear()
+
+    @CacheHandler._track_get_many_
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        rv = {}
+        with self.lock:
+            now = time.time()
+            for key in keys:
+                rkey = self._prefix + key
+                element = self.data.get(rkey)
+                if element is None or element.exp < now:
+                    continue
+                self._heap_acc.remove((element.acc, rkey))
+                element.acc = now
+                heapq.heappush(self._heap_acc, (now, rkey))
+                rv[key] = element.value
+        return rv
+
+    @CacheHandler._track_set_many_
+    def set_many(
+        self, mapping: Dict[str, Any], duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None
+    ):
+        now = time.time()
+        expiration = now + self._duration(duration)
+        with self.lock:
+            for key, value in mapping.items():
+                rkey = self._prefix + key
+                self._remove(rkey)
+                heapq.heappush(self._heap_exp, (expiration, rkey))
+                heapq.heappush(self._heap_acc, (now, rkey))
+                self.data[rkey] = RamElement(value, expiration, now)
+                self._tag(rkey, tags)
+            #: prune once the whole batch is stored, to respect the threshold
+            self._prune(now)
+
+    def delete_many(self, keys: List[str]):
+        with self.lock:
+            for key in keys:
+                self._remove(self._prefix + key)
+
+    def clear_tags(self, *tags: str):
+        with self.lock:
+            for rkey in set().union(*[self._tags.get(tag, ()) for tag in tags]):
+                self._remove(rkey)
+
+
+class RedisCache(CacheHandler, _RedisCache):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        password: Optional[str] = None,
+        db: int = 0,
+        prefix: str = "cache:",
+        default_expire: int = 300,
+        process_lock: bool = False,
+        lock_timeout: int = 30,
+        serializer: str = "pickle",
+        compression: Optional[str] = None,
+        compress_threshold: int = 1024,
+        **kwargs,
+    ):
+        super().__init__(
+            host=host, port=port, password=password, db=db, prefix=prefix, default_expire=default_expire, **kwargs
+        )
+        self._use_process_lock = process_lock
+        self._lock_timeout = lock_timeout
+        self._codec = CacheCodec(serializer, compression, compress_threshold)
+
+    def _dump_obj(self, value: Any) -> bytes:
+        #: integers stay plain to keep them usable with redis increments
+        if isinstance(value, int):
+            return str(value).encode("ascii")
+        return self._codec.dumps(value)
+
+    def _load_obj(self, value: Any) -> Any:
+        if value is None or not CacheCodec.is_encoded(value):
+            return super()._load_obj(value)
+        try:
+            return self._codec.loads(value)
+        except Exception:
+            return None
+
+    def _process_lock(self, key: str) -> Optional[CacheLock]:
+        if not self._use_process_lock:
+            return None
+        lock = self._cache.lock(self._prefix + "lock:" + key, timeout=self._lock_timeout)
+        return RedisCacheLock(lock, self._lock_timeout)
+
+    def _tag_key(self, tag: str) -> str:
+        return self._prefix + "tag:" + tag
+
+    def _add_tags(self, keys: List[str], tags: List[str], ttl: int):
+        with self._cache.pipeline() as pipe:
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), *keys)
+                pipe.ttl(self._tag_key(tag))
+            current_ttls = pipe.execute()[1::2]
+            #: tag sets should live as long as their longest living key
+            for tag, current_ttl in zip(tags, current_ttls):
+                if current_ttl < ttl:
+                    pipe.expire(self._tag_key(tag), ttl)
+            pipe.execute()
+
+    @CacheHandler._track_get_
+    def get(self, key: str) -> Any:
+        return super().get(key)
+
+    @CacheHandler._track_set_
+    def set(self, key: str, value: Any, duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None):
+        super().set(key, value, duration)
+        if tags:
+            self._add_tags([key], tags, self._duration(duration))
+
+    @CacheHandler._track_get_many_
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        values = self._cache.mget([self._prefix + key for key in keys])
+        rv = {}
+        for key, value in zip(keys, values):
+            value = self._load_obj(value)
+            if value is not None:
+                rv[key] = value
+        return rv
+
+    @CacheHandler._track_set_many_
+    def set_many(
+        self, mapping: Dict[str, Any], duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None
+    ):
+        if not mapping:
+            return
+        ttl = self._duration(duration)
+        with self._cache.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.setex(name=self._prefix + key, time=ttl, value=self._dump_obj(value))
+            pipe.execute()
+        if tags:
+            self._add_tags(list(mapping), tags, ttl)
+
+    def delete_many(self, keys: List[str]):
+        if keys:
+            self._cache.delete(*[self._prefix + key for key in keys])
+
+    def clear_tags(self, *tags: str):
+        if not tags:
+            return
+        names = [self._tag_key(tag) for tag in tags]
+        keys = [self._prefix + key.decode("utf8") for key in self._cache.sunion(names)]
+        self._cache.delete(*keys, *names)
+
+
+class Cache(_Cache):
+    def __init__(self, **kwargs):
+        if all(key == "default" for key in kwargs):
+            kwargs["ram"] = RamCache()
+        super().__init__(**kwargs)
+        self._handlers: Dict[str, CacheHandler] = {key: val for key, val in kwargs.items() if key != "default"}
+
+    def set(self, key: str, value: Any, duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None):
+        self._default_handler._set(key, value, duration, tags)
+
+    def get_or_set(
+        self,
+        key: str,
+        function: Callable[..., T],
+        duration: Union[int, str, None] = "default",
+        stale_ttl: int = 0,
+        early_beta: float = 0,
+        tags: Optional[List[str]] = None,
+    ) -> T:
+        return self._default_handler.get_or_set(key, function, duration, stale_ttl, early_beta, tags)
+
+    async def get_or_set_loop(
+        self,
+        key: str,
+        function: Callable[[], T],
+        duration: Union[int, str, None] = "default",
+        stale_ttl: int = 0,
+        early_beta: float = 0,
+        tags: Optional[List[str]] = None,
+    ) -> T:
+        return await self._default_handler.get_or_set_loop(key, function, duration, stale_ttl, early_beta, tags)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: handler.stats() for name, handler in self._handlers.items() if isinstance(handler, CacheHandler)}
+
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        return self._default_handler.get_many(keys)
+
+    def set_many(
+        self, mapping: Dict[str, Any], duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None
+    ):
+        self._default_handler.set_many(mapping, duration, tags)
+
+    def delete_many(self, keys: List[str]):
+        self._default_handler.delete_many(keys)
+
+    def clear_tags(self, *tags: str):
+        self._default_handler.clear_tags(*tags)
+
+    def clear_tags_on_commit(self, model: Any, *tags: str, row_tags: Optional[Callable[[Any], List[str]]] = None):
+        self._default_handler.clear_tags_on_commit(model, *tags, row_tags=row_tags)
+
+
+class DiskCacheIndex:
+    #: tracks expiration and last access of `DiskCache` entries in a sqlite sidecar,
+    #  so expired and least recently used entries can be found without scanning the directory
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS entries (name TEXT PRIMARY KEY, exp REAL NOT NULL, acc REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS entries_exp ON entries (exp)",
+        "CREATE INDEX IF NOT EXISTS entries_acc ON entries (acc)",
+        "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS tags (tag TEXT NOT NULL, name TEXT NOT NULL, PRIMARY KEY (tag, name))",
+        "CREATE INDEX IF NOT EXISTS tags_name ON tags (name)",
+        "CREATE TRIGGER IF NOT EXISTS entries_tags AFTER DELETE ON entries "
+        "BEGIN DELETE FROM tags WHERE name = OLD.name; END",
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self.created = not os.path.exists(path)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        #: connections can't be shared across forked processes
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self._schema:
+                self._conn.execute(statement)
+            self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('count', 0)")
+            self._pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def transaction(self) -> Generator[sqlite3.Connection, None, None]:
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _incr_count(self, conn: sqlite3.Connection, value: int):
+        if value:
+            conn.execute("UPDATE meta SET value = value + ? WHERE name = 'count'", (value,))
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT value FROM meta WHERE name = 'count'").fetchone()[0]
+
+    def has(self, name: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM entries WHERE name = ?", (name,)).fetchone() is not None
+
+    def add(self, name: str, exp: float, acc: float, tags: Optional[List[str]] = None):
+        self.add_many([name], exp, acc, tags)
+
+    def add_many(self, names: List[str], exp: float, acc: float, tags: Optional[List[str]] = None):
+        with self.transaction() as conn:
+            added = 0
+            for name in names:
+                exists = conn.execute("SELECT 1 FROM entries WHERE name = ?", (name,)).fetchone() is not None
+                conn.execute("INSERT OR REPLACE INTO entries (name, exp, acc) VALUES (?, ?, ?)", (name, exp, acc))
+                conn.execute("DELETE FROM tags WHERE name = ?", (name,))
+                if tags:
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO tags (tag, name) VALUES (?, ?)", [(tag, name) for tag in tags]
+                    )
+                added += 0 if exists else 1
+            self._incr_count(conn, added)
+
+    def touch_many(self, accesses: Dict[str, float]):
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE entries SET acc = ? WHERE name = ?", [(acc, name) for name, acc in accesses.items()]
+            )
+
+    def remove(self, name: str):
+        self.remove_many([name])
+
+    def remove_many(self, names: List[str]):
+        with self.transaction() as conn:
+            removed = 0
+            for name in names:
+                removed += conn.execute("DELETE FROM entries WHERE name = ?", (name,)).rowcount
+            self._incr_count(conn, -removed)
+
+    def _pop(self, query: str, params: Tuple[Any, ...]) -> List[str]:
+        with self.transaction() as conn:
+            names = [row[0] for row in conn.execute(query, params)]
+            conn.executemany("DELETE FROM entries WHERE name = ?", [(name,) for name in names])
+            self._incr_count(conn, -len(names))
+        return names
+
+    def pop_expired(self, now: float) -> List[str]:
+        return self._pop("SELECT name FROM entries WHERE exp <= ? ORDER BY exp", (now,))
+
+    def pop_oldest(self, count: int) -> List[str]:
+        return self._pop("SELECT name FROM entries ORDER BY acc LIMIT ?", (count,))
+
+    def pop_tagged(self, tags: Tuple[str, ...]) -> List[str]:
+        placeholders = ", ".join("?" for _ in tags)
+        return self._pop(f"SELECT DISTINCT name FROM tags WHERE tag IN ({placeholders})", tags)  # noqa: S608
+
+    def clear(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("UPDATE meta SET value = 0 WHERE name = 'count'")
 
 
 class DiskCache(CacheHandler):
     lock = threading.RLock()
     _fs_transaction_suffix = ".__mt_cache"
+    _fs_index_name = "__index__"
+    _fs_lock_name = "__lock__"
+    _fs_lock_buckets = 64
     _fs_mode = 0o600
+    #: raw entries: magic, payload kind and expiration followed by the payload
+    _fs_raw_header = struct.Struct("<4sBd")
+    _fs_raw_magic = b"EMRC"
+    _fs_raw_kinds = {bytes: 0, str: 1}
+    #: access times are buffered and written to the index in batches
+    _fs_touch_batch = 256
+    _fs_touch_interval = 10
 
-    def __init__(self, cache_dir: str = "cache", threshold: int = 500, default_expire: int = 300):
+    def __init__(
+        self,
+        cache_dir: str = "cache",
+        threshold: int = 500,
+        default_expire: int = 300,
+        raw: bool = False,
+        process_lock: bool = False,
+        lock_timeout: int = 30,
+        serializer: str = "pickle",
+        compression: Optional[str] = None,
+        compress_threshold: int = 1024,
+    ):
         super().__init__(default_expire=default_expire)
         self._threshold = threshold
+        self._raw = raw
+        self._codec = CacheCodec(serializer, compression, compress_threshold)
+        self._use_process_lock = process_lock
+        self._lock_timeout = lock_timeout
         self._path = os.path.join(current.app.root_path, cache_dir)
         #: create required paths if needed
         if not os.path.exists(self._path):
             os.mkdir(self._path)
+        self._index = DiskCacheIndex(os.path.join(self._path, self._fs_index_name))
+        self._touches: Dict[str, float] = {}
+        self._touches_flushed = time.time()
+        #: index entries already on disk (eg: written by previous versions)
+        if self._index.created:
+            self._rebuild_index()
 
     def _get_filename(self, key: str) -> str:
         khash = hashlib_sha1(key).hexdigest()
@@ -53,68 +1116,798 @@ class DiskCache(CacheHandler):
         return [
             os.path.join(self._path, fn)
             for fn in os.listdir(self._path)
-            if not fn.endswith(self._fs_transaction_suffix)
+            if not fn.endswith(self._fs_transaction_suffix) and not fn.startswith("__")
         ]
 
-    def _prune(self):
+    def _process_lock(self, key: str) -> Optional[CacheLock]:
+        if not self._use_process_lock:
+            return None
+        #: locks are bucketed to keep the number of lock files bounded
+        bucket = int(hashlib_sha1(key).hexdigest()[:8], 16) % self._fs_lock_buckets
+        return FileCacheLock(os.path.join(self._path, f"{self._fs_lock_name}{bucket}"), self._lock_timeout)
+
+    def _load_exp(self, f) -> float:
+        header = f.read(self._fs_raw_header.size)
+        if header[:4] == self._fs_raw_magic:
+            return self._fs_raw_header.unpack(header)[2]
+        f.seek(0)
+        return pickle.load(f)
+
+    def _rebuild_index(self):
         with self.lock:
-            entries = self._list_dir()
-            if len(entries) > self._threshold:
-                now = time.time()
+            now = time.time()
+            for fpath in self._list_dir():
                 try:
-                    for i, fpath in enumerate(entries):
-                        remove = False
-                        f = LockedFile(fpath, "rb")
-                        exp = pickle.load(f.file)
-                        f.close()
-                        remove = exp <= now or i % 3 == 0
-                        if remove:
-                            self._del_file(fpath)
+                    f = LockedFile(fpath, "rb")
+                    exp = self._load_exp(f.file)
+                    f.close()
                 except Exception:
-                    pass
+                    self._del_file(fpath)
+                    continue
+                self._index.add(os.path.basename(fpath), exp, now)
+
+    def _prune(self, now: float, incoming: int = 1):
+        with self.lock:
+            if self._index.count() + incoming <= self._threshold:
+                return
+            expired = self._index.pop_expired(now)
+            for name in expired:
+                self._del_file(os.path.join(self._path, name))
+            self._stats.record_expirations(len(expired))
+            overflow = self._index.count() - self._threshold + incoming
+            if overflow > 0:
+                #: eviction relies on up to date access times
+                self._flush_touches(now)
+                evicted = self._index.pop_oldest(overflow)
+                for name in evicted:
+                    self._del_file(os.path.join(self._path, name))
+                self._stats.record_evictions(len(evicted))
+
+    def _touch(self, names: List[str], now: float):
+        #: reads stay read-only on the index: access times are only needed to pick entries
+        #  to evict, so they're flushed when evicting or once enough of them are pending
+        for name in names:
+            self._touches[name] = now
+        if len(self._touches) >= self._fs_touch_batch or now - self._touches_flushed >= self._fs_touch_interval:
+            self._flush_touches(now)
+
+    def _flush_touches(self, now: float):
+        if self._touches:
+            self._index.touch_many(self._touches)
+            self._touches.clear()
+        self._touches_flushed = now
+
+    def _load_raw(self, f, now: float) -> Tuple[float, Union[memoryview, str, None]]:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _, kind, exp = self._fs_raw_header.unpack_from(mapped)
+        if exp < now or kind == self._fs_raw_kinds[str]:
+            with mapped:
+                return exp, None if exp < now else mapped[self._fs_raw_header.size :].decode("utf8")
+        #: the view keeps the file mapped after the descriptor gets closed
+        return exp, memoryview(mapped)[self._fs_raw_header.size :]
+
+    def _read(self, filename: str, now: float) -> Tuple[float, Any]:
+        f = LockedFile(filename, "rb")
+        try:
+            if f.file.read(4) == self._fs_raw_magic:
+                return self._load_raw(f.file, now)
+            f.file.seek(0)
+            exp = pickle.load(f.file)
+            return exp, self._load_value(f.file.read()) if exp >= now else None
+        finally:
+            f.close()
 
+    @CacheHandler._track_get_
     def get(self, key: str) -> Any:
         filename = self._get_filename(key)
         try:
             with self.lock:
                 now = time.time()
-                f = LockedFile(filename, "rb")
-                exp = pickle.load(f.file)
+                exp, val = self._read(filename, now)
                 if exp < now:
-                    f.close()
+                    self._index.remove(os.path.basename(filename))
+                    self._del_file(filename)
+                    self._stats.record_expirations()
                     return None
-                val = pickle.load(f.file)
-                f.close()
+                self._touch([os.path.basename(filename)], now)
         except Exception:
             return None
         return val
 
+    @CacheHandler._track_get_many_
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        rv, fresh, expired = {}, [], []
+        with self.lock:
+            now = time.time()
+            for key in keys:
+                filename = self._get_filename(key)
+                try:
+                    exp, val = self._read(filename, now)
+                except Exception:
+                    #: unreadable entries are dropped as expired ones
+                    exp, val = 0, None
+                if exp < now:
+                    expired.append(filename)
+                    continue
+                fresh.append(os.path.basename(filename))
+                rv[key] = val
+            if expired:
+                self._index.remove_many([os.path.basename(filename) for filename in expired])
+                for filename in expired:
+                    self._del_file(filename)
+                self._stats.record_expirations(len(expired))
+            if fresh:
+                self._touch(fresh, now)
+        return rv
+
+    def _load_value(self, data: bytes) -> Any:
+        #: entries written before codecs were introduced are plain pickles
+        if CacheCodec.is_encoded(data):
+            return self._codec.loads(data)
+        return pickle.loads(data)
+
+    def _dump(self, value: Any, expiration: float) -> Tuple[bytes, Any]:
+        #: encodes header and payload, serialization errors are raised to the caller
+        if self._raw and isinstance(value, (bytes, bytearray, memoryview, str)):
+            kind = self._fs_raw_kinds[str if isinstance(value, str) else bytes]
+            header = self._fs_raw_header.pack(self._fs_raw_magic, kind, expiration)
+            return header, value.encode("utf8") if isinstance(value, str) else value
+        return pickle.dumps(expiration, 1), self._codec.dumps(value)
+
+    def _write(self, filename: str, data: Tuple[bytes, Any]) -> bool:
+        try:
+            fd, tmp = tempfile.mkstemp(suffix=self._fs_transaction_suffix, dir=self._path)
+            with os.fdopen(fd, "wb") as f:
+                f.write(data[0])
+                f.write(data[1])
+            os.replace(tmp, filename)
+            os.chmod(filename, self._fs_mode)
+        except Exception:
+            return False
+        return True
+
+    @CacheHandler._track_set_
     @CacheHandler._convert_duration_
     def set(self, key: str, value: Any, **kwargs):
         filename = self._get_filename(key)
-        filepath = os.path.join(self._path, filename)
+        name = os.path.basename(filename)
+        data = self._dump(value, kwargs["expiration"])
         with self.lock:
-            self._prune()
-            if os.path.exists(filepath):
-                self._del_file(filepath)
-            try:
-                fd, tmp = tempfile.mkstemp(suffix=self._fs_transaction_suffix, dir=self._path)
-                with os.fdopen(fd, "wb") as f:
-                    pickle.dump(kwargs["expiration"], f, 1)
-                    pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
-                os.rename(tmp, filename)
-                os.chmod(filename, self._fs_mode)
-            except Exception:
-                pass
+            if not self._index.has(name):
+                self._prune(kwargs["now"])
+            if self._write(filename, data):
+                self._index.add(name, kwargs["expiration"], kwargs["now"], kwargs.get("tags"))
+
+    @CacheHandler._track_set_many_
+    def set_many(
+        self, mapping: Dict[str, Any], duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None
+    ):
+        now = time.time()
+        expiration = now + self._duration(duration)
+        #: encode everything first, so nothing gets written when a value can't be serialized
+        data = {self._get_filename(key): self._dump(value, expiration) for key, value in mapping.items()}
+        with self.lock:
+            incoming = sum(1 for filename in data if not self._index.has(os.path.basename(filename)))
+            if incoming:
+                self._prune(now, incoming)
+            names = [os.path.basename(filename) for filename, item in data.items() if self._write(filename, item)]
+            if names:
+                self._index.add_many(names, expiration, now, tags)
+
+    def delete_many(self, keys: List[str]):
+        filenames = [self._get_filename(key) for key in keys]
+        with self.lock:
+            self._index.remove_many([os.path.basename(filename) for filename in filenames])
+            for filename in filenames:
+                self._del_file(filename)
 
     def clear(self, key: Optional[str] = None):
         with self.lock:
             if key is not None:
                 filename = self._get_filename(key)
-                try:
-                    os.remove(filename)
-                    return
-                except Exception:
-                    return
+                self._index.remove(os.path.basename(filename))
+                self._del_file(filename)
+                return
+            self._index.clear()
+            self._touches.clear()
             for name in self._list_dir():
                 self._del_file(name)
+
+    def clear_tags(self, *tags: str):
+        with self.lock:
+            for name in self._index.pop_tagged(tags):
+                self._del_file(os.path.join(self._path, name))
+
+
+def _shm_hash(key: bytes) -> int:
+    #: builtin hash is randomized per process, we need a stable one
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class SharedMemoryCache(CacheHandler):
+    #: the segment holds an open addressing hash table and a data area split in pages,
+    #  assigned on demand to slab classes of fixed size chunks (powers of 2 from `_min_chunk`).
+    #  When a class runs out of chunks and pages, its entries get evicted with CLOCK,
+    #  and classes without entries to evict take over the page of the next CLOCK victim.
+    _magic = b"EMTSHMC1"
+    #: magic, slots, pages, page size, chunks per page, clock hand, count, next page
+    _header = struct.Struct("<8sIIIIIII")
+    _max_classes = 32
+    _heads = struct.Struct(f"<{_max_classes}I")
+    #: key hash, expiration, chunk ref, data size, used flag, reference bit
+    _entry = struct.Struct("<QdIIBB6x")
+    #: key length, value length, tags length
+    _item = struct.Struct("<III")
+    _min_chunk = 128
+    _null = 0xFFFFFFFF
+    _max_load = 0.9
+
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        size: int = 64 * 1024 * 1024,
+        slots: int = 65536,
+        page_size: int = 1024 * 1024,
+        prefix: str = "",
+        default_expire: int = 300,
+    ):
+        super().__init__(prefix=prefix, default_expire=default_expire)
+        try:
+            import fcntl
+            from multiprocessing import shared_memory
+        except ImportError:
+            raise RuntimeError("SharedMemoryCache is not supported on this platform")
+        self._flock = fcntl.flock
+        self._flock_ex, self._flock_un = fcntl.LOCK_EX, fcntl.LOCK_UN
+        self._name = name or "emt_" + hashlib_sha1(current.app.root_path).hexdigest()[:16]
+        self._tlock = threading.Lock()
+        self._lock_path = os.path.join(tempfile.gettempdir(), self._name + ".lock")
+        self._lock_file: Optional[Any] = None
+        self._lock_pid: Optional[int] = None
+        pages = max(size // page_size, 1)
+        with self._locked():
+            try:
+                self._shm = shared_memory.SharedMemory(
+                    name=self._name, create=True, size=self._segment_size(slots, pages, page_size)
+                )
+                created = True
+            except FileExistsError:
+                self._shm = shared_memory.SharedMemory(name=self._name)
+                created = False
+            self._track(False)
+            self._buf = self._shm.buf
+            if created:
+                self._header.pack_into(
+                    self._buf, 0, self._magic, slots, pages, page_size, page_size // self._min_chunk, 0, 0, 0
+                )
+                self._reset()
+        magic, *layout = self._header.unpack_from(self._buf)[:4]
+        if magic != self._magic:
+            self.close()
+            raise RuntimeError(f"shared memory segment {self._name} is not a cache")
+        if layout != [slots, pages, page_size]:
+            self.close()
+            raise RuntimeError(
+                f"shared memory segment {self._name} has a different layout "
+                f"(slots={layout[0]}, size={layout[1] * layout[2]}, page_size={layout[2]})"
+            )
+        self._load_layout()
+
+    @classmethod
+    def _segment_size(cls, slots: int, pages: int, page_size: int) -> int:
+        return cls._header.size + cls._heads.size + slots * cls._entry.size + pages + pages * page_size
+
+    def _track(self, register: bool):
+        #: the resource tracker would unlink the segment when any worker exits
+        try:
+            from multiprocessing import resource_tracker
+
+            method = resource_tracker.register if register else resource_tracker.unregister
+            method(self._shm._name, "shared_memory")
+        except Exception:
+            pass
+
+    def _load_layout(self):
+        _, self._slots, self._pages, self._page_size, self._page_chunks, *_ = self._header.unpack_from(self._buf)
+        self._classes = []
+        chunk_size = self._min_chunk
+        while chunk_size <= self._page_size and len(self._classes) < self._max_classes:
+            self._classes.append(chunk_size)
+            chunk_size *= 2
+        self._heads_offset = self._header.size
+        self._table_offset = self._heads_offset + self._heads.size
+        self._pages_offset = self._table_offset + self._slots * self._entry.size
+        self._data_offset = self._pages_offset + self._pages
+
+    def _reset(self):
+        _, slots, pages, *_ = self._header.unpack_from(self._buf)
+        self._set_header(hand=0, count=0, next_page=0)
+        self._heads.pack_into(self._buf, self._header.size, *([self._null] * self._max_classes))
+        start = self._header.size + self._heads.size
+        end = start + slots * self._entry.size + pages
+        self._buf[start:end] = bytes(end - start)
+
+    def _lock_fd(self) -> int:
+        #: flock locks belong to the open file, so forked processes need their own
+        if self._lock_pid != os.getpid():
+            self._lock_file = open(self._lock_path, "a+b")
+            self._lock_pid = os.getpid()
+        return self._lock_file.fileno()  # type: ignore
+
+    @contextmanager
+    def _locked(self) -> Generator[None, None, None]:
+        with self._tlock:
+            fd = self._lock_fd()
+            self._flock(fd, self._flock_ex)
+            try:
+                yield
+            finally:
+                self._flock(fd, self._flock_un)
+
+    def _get_header(self) -> Tuple[int, int, int]:
+        return self._header.unpack_from(self._buf)[5:]
+
+    def _set_header(self, hand: int, count: int, next_page: int):
+        struct.pack_into("<III", self._buf, self._header.size - 12, hand, count, next_page)
+
+    def _read_entry(self, idx: int) -> Tuple[int, float, int, int, int, int]:
+        return self._entry.unpack_from(self._buf, self._table_offset + idx * self._entry.size)
+
+    def _write_entry(self, idx: int, *values: Any):
+        self._entry.pack_into(self._buf, self._table_offset + idx * self._entry.size, *values)
+
+    def _clear_entry(self, idx: int):
+        self._write_entry(idx, 0, 0, 0, 0, 0, 0)
+
+    def _chunk_offset(self, ref: int) -> int:
+        page, idx = divmod(ref, self._page_chunks)
+        chunk_size = self._classes[self._buf[self._pages_offset + page] - 1]
+        return self._data_offset + page * self._page_size + idx * chunk_size
+
+    def _chunk_class(self, ref: int) -> int:
+        return self._buf[self._pages_offset + ref // self._page_chunks] - 1
+
+    def _size_class(self, size: int) -> Optional[int]:
+        for idx, chunk_size in enumerate(self._classes):
+            if size <= chunk_size:
+                return idx
+        return None
+
+    def _read_key(self, ref: int) -> bytes:
+        offset = self._chunk_offset(ref)
+        klen, _, _ = self._item.unpack_from(self._buf, offset)
+        offset += self._item.size
+        return bytes(self._buf[offset : offset + klen])
+
+    def _read_value(self, ref: int) -> bytes:
+        offset = self._chunk_offset(ref)
+        klen, vlen, _ = self._item.unpack_from(self._buf, offset)
+        offset += self._item.size + klen
+        return bytes(self._buf[offset : offset + vlen])
+
+    def _read_tags(self, ref: int) -> List[bytes]:
+        offset = self._chunk_offset(ref)
+        klen, vlen, tlen = self._item.unpack_from(self._buf, offset)
+        if not tlen:
+            return []
+        offset += self._item.size + klen + vlen
+        return bytes(self._buf[offset : offset + tlen]).split(b"\x00")
+
+    def _find(self, khash: int, key: bytes) -> Tuple[int, bool]:
+        idx = khash % self._slots
+        while True:
+            ehash, _, ref, _, used, _ = self._read_entry(idx)
+            if not used:
+                return idx, False
+            if ehash == khash and self._read_key(ref) == key:
+                return idx, True
+            idx = (idx + 1) % self._slots
+
+    def _free_chunk(self, ref: int):
+        cls = self._chunk_class(ref)
+        heads = list(self._heads.unpack_from(self._buf, self._heads_offset))
+        struct.pack_into("<I", self._buf, self._chunk_offset(ref), heads[cls])
+        heads[cls] = ref
+        self._heads.pack_into(self._buf, self._heads_offset, *heads)
+
+    def _delete(self, idx: int):
+        #: backward shift deletion keeps probing sequences intact without tombstones
+        self._free_chunk(self._read_entry(idx)[2])
+        hand, count, next_page = self._get_header()
+        self._set_header(hand, count - 1, next_page)
+        self._clear_entry(idx)
+        nxt = (idx + 1) % self._slots
+        while True:
+            entry = self._read_entry(nxt)
+            if not entry[4]:
+                break
+            home = entry[0] % self._slots
+            if (nxt > idx and (home <= idx or home > nxt)) or (nxt < idx and idx >= home > nxt):
+                self._write_entry(idx, *entry)
+                self._clear_entry(nxt)
+                idx = nxt
+            nxt = (nxt + 1) % self._slots
+
+    def _evict(self, now: float, cls: Optional[int] = None) -> Optional[int]:
+        #: returns the chunk reference of the evicted entry
+        for _ in range(self._slots * 2):
+            hand, count, next_page = self._get_header()
+            self._set_header((hand + 1) % self._slots, count, next_page)
+            khash, exp, ref, size, used, bit = self._read_entry(hand)
+            if not used or (cls is not None and self._chunk_class(ref) != cls):
+                continue
+            if bit and exp >= now:
+                self._write_entry(hand, khash, exp, ref, size, used, 0)
+                continue
+            self._delete(hand)
+            #: the backward shift can move an entry in the current slot, so we examine it again
+            _, count, next_page = self._get_header()
+            self._set_header(hand, count, next_page)
+            if exp < now:
+                self._stats.record_expirations()
+            else:
+                self._stats.record_evictions()
+            return ref
+        return None
+
+    def _link_page(self, page: int, cls: int, heads: List[int]):
+        #: assigns the page to the class, linking all its chunks into the class free list
+        self._buf[self._pages_offset + page] = cls + 1
+        chunk_size, base = self._classes[cls], page * self._page_chunks
+        offset = self._data_offset + page * self._page_size
+        nchunks = self._page_size // chunk_size
+        for idx in range(nchunks):
+            nxt = base + idx + 1 if idx + 1 < nchunks else heads[cls]
+            struct.pack_into("<I", self._buf, offset + idx * chunk_size, nxt)
+        heads[cls] = base
+        self._heads.pack_into(self._buf, self._heads_offset, *heads)
+
+    def _reassign_page(self, cls: int, now: float) -> bool:
+        #: moves the page of the next CLOCK victim, or any page of other classes, to the given class
+        ref = self._evict(now)
+        if ref is not None:
+            page = ref // self._page_chunks
+        else:
+            page = next((idx for idx in range(self._pages) if self._buf[self._pages_offset + idx] != cls + 1), None)
+            if page is None:
+                return False
+        old = self._buf[self._pages_offset + page] - 1
+        if old == cls:
+            return True
+        keys = []
+        for idx in range(self._slots):
+            khash, _, eref, _, used, _ = self._read_entry(idx)
+            if used and eref // self._page_chunks == page:
+                keys.append((khash, self._read_key(eref)))
+        for khash, bkey in keys:
+            idx, found = self._find(khash, bkey)
+            if found:
+                self._delete(idx)
+        self._stats.record_evictions(len(keys))
+        #: unlink the page chunks from the free list of the previous class
+        heads = list(self._heads.unpack_from(self._buf, self._heads_offset))
+        refs, ref = [], heads[old]
+        while ref != self._null:
+            if ref // self._page_chunks != page:
+                refs.append(ref)
+            ref = struct.unpack_from("<I", self._buf, self._chunk_offset(ref))[0]
+        for ref, nxt in zip(refs, refs[1:] + [self._null]):
+            struct.pack_into("<I", self._buf, self._chunk_offset(ref), nxt)
+        heads[old] = refs[0] if refs else self._null
+        self._link_page(page, cls, heads)
+        return True
+
+    def _alloc_chunk(self, cls: int, now: float) -> Optional[int]:
+        while True:
+            heads = list(self._heads.unpack_from(self._buf, self._heads_offset))
+            ref = heads[cls]
+            if ref != self._null:
+                heads[cls] = struct.unpack_from("<I", self._buf, self._chunk_offset(ref))[0]
+                self._heads.pack_into(self._buf, self._heads_offset, *heads)
+                return ref
+            hand, count, next_page = self._get_header()
+            if next_page < self._pages:
+                self._set_header(hand, count, next_page + 1)
+                self._link_page(next_page, cls, heads)
+                continue
+            if self._evict(now, cls) is None and not self._reassign_page(cls, now):
+                return None
+
+    def _lookup(self, key: str, now: float) -> Optional[bytes]:
+        bkey = key.encode("utf8")
+        khash = _shm_hash(bkey)
+        idx, found = self._find(khash, bkey)
+        if not found:
+            return None
+        _, exp, ref, size, used, _ = self._read_entry(idx)
+        if exp < now:
+            self._delete(idx)
+            self._stats.record_expirations()
+            return None
+        self._write_entry(idx, khash, exp, ref, size, used, 1)
+        return self._read_value(ref)
+
+    def _item_class(self, key: str, data: bytes, btags: bytes) -> int:
+        size = self._item.size + len(key.encode("utf8")) + len(data) + len(btags)
+        cls = self._size_class(size)
+        if cls is None:
+            #: don't let readers get the previous value
+            with self._locked():
+                self._remove(key)
+            raise ValueError(f"cache item of {size} bytes exceeds the maximum size of {self._classes[-1]} bytes")
+        return cls
+
+    def _store(self, key: str, data: bytes, btags: bytes, expiration: float, now: float, cls: int):
+        bkey = key.encode("utf8")
+        khash = _shm_hash(bkey)
+        size = self._item.size + len(bkey) + len(data) + len(btags)
+        idx, found = self._find(khash, bkey)
+        if found:
+            self._delete(idx)
+        _, count, _ = self._get_header()
+        if count + 1 > self._slots * self._max_load:
+            self._evict(now)
+        ref = self._alloc_chunk(cls, now)
+        if ref is None:
+            self._stats.record_drops()
+            return
+        offset = self._chunk_offset(ref)
+        self._item.pack_into(self._buf, offset, len(bkey), len(data), len(btags))
+        offset += self._item.size
+        self._buf[offset : offset + len(bkey)] = bkey
+        offset += len(bkey)
+        self._buf[offset : offset + len(data)] = data
+        offset += len(data)
+        self._buf[offset : offset + len(btags)] = btags
+        idx, _ = self._find(khash, bkey)
+        self._write_entry(idx, khash, expiration, ref, size, 1, 0)
+        hand, count, next_page = self._get_header()
+        self._set_header(hand, count + 1, next_page)
+
+    def _remove(self, key: str):
+        bkey = key.encode("utf8")
+        idx, found = self._find(_shm_hash(bkey), bkey)
+        if found:
+            self._delete(idx)
+
+    @staticmethod
+    def _dump_tags(tags: Optional[List[str]]) -> bytes:
+        return b"\x00".join(tag.encode("utf8") for tag in tags or [])
+
+    @staticmethod
+    def _load_value(data: Optional[bytes]) -> Any:
+        if data is None:
+            return None
+        try:
+            return pickle.loads(data)
+        except Exception:
+            return None
+
+    @CacheHandler._track_get_
+    @CacheHandler._key_prefix_
+    def get(self, key: str) -> Any:
+        with self._locked():
+            data = self._lookup(key, time.time())
+        return self._load_value(data)
+
+    @CacheHandler._track_get_many_
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        with self._locked():
+            now = time.time()
+            found = {key: self._lookup(self._prefix + key, now) for key in keys}
+        rv = {}
+        for key, data in found.items():
+            value = self._load_value(data)
+            if value is not None:
+                rv[key] = value
+        return rv
+
+    @CacheHandler._track_set_
+    @CacheHandler._key_prefix_
+    @CacheHandler._convert_duration_
+    def set(self, key: str, value: Any, **kwargs):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        btags = self._dump_tags(kwargs.get("tags"))
+        cls = self._item_class(key, data, btags)
+        with self._locked():
+            self._store(key, data, btags, kwargs["expiration"], kwargs["now"], cls)
+
+    @CacheHandler._track_set_many_
+    def set_many(
+        self, mapping: Dict[str, Any], duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None
+    ):
+        btags = self._dump_tags(tags)
+        items = []
+        for key, value in mapping.items():
+            key, data = self._prefix + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            items.append((key, data, self._item_class(key, data, btags)))
+        with self._locked():
+            now = time.time()
+            expiration = now + self._duration(duration)
+            for key, data, cls in items:
+                self._store(key, data, btags, expiration, now, cls)
+
+    @CacheHandler._key_prefix_
+    def clear(self, key: Optional[str] = None):
+        with self._locked():
+            if key is not None:
+                self._remove(key)
+                return
+            self._reset()
+
+    def delete_many(self, keys: List[str]):
+        with self._locked():
+            for key in keys:
+                self._remove(self._prefix + key)
+
+    def clear_tags(self, *tags: str):
+        #: tags are stored within the items, so we need to scan the table
+        btags = {tag.encode("utf8") for tag in tags}
+        with self._locked():
+            keys = []
+            for idx in range(self._slots):
+                khash, _, ref, _, used, _ = self._read_entry(idx)
+                if used and btags.intersection(self._read_tags(ref)):
+                    keys.append((khash, self._read_key(ref)))
+            for khash, bkey in keys:
+                idx, found = self._find(khash, bkey)
+                if found:
+                    self._delete(idx)
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        if self._lock_file is not None and self._lock_pid == os.getpid():
+            self._lock_file.close()
+        self._lock_file = self._lock_pid = None
+
+    def unlink(self):
+        with self._locked():
+            self._track(True)
+            self._shm.unlink()
+            try:
+                os.unlink(self._lock_path)
+            except FileNotFoundError:
+                pass
+
+
+class CacheBroadcast:
+    def __init__(self):
+        self._listeners: List[Callable[[str, Optional[str]], None]] = []
+
+    def subscribe(self, listener: Callable[[str, Optional[str]], None]):
+        self._listeners.append(listener)
+
+    def _dispatch(self, origin: str, key: Optional[str]):
+        for listener in self._listeners:
+            listener(origin, key)
+
+    def publish(self, origin: str, key: Optional[str]):
+        raise NotImplementedError
+
+
+class LocalBroadcast(CacheBroadcast):
+    def publish(self, origin: str, key: Optional[str]):
+        self._dispatch(origin, key)
+
+
+class RedisBroadcast(CacheBroadcast):
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        password: Optional[str] = None,
+        db: int = 0,
+        channel: str = "cache:invalidations",
+        **kwargs,
+    ):
+        super().__init__()
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("no redis module found")
+        self._channel = channel
+        self._client = redis.Redis(host=host, port=port, password=password, db=db, **kwargs)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{channel: self._on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def _on_message(self, message: Dict[str, Any]):
+        origin, key = message["data"].decode("utf8").split(" ", 1)
+        self._dispatch(origin, key[1:] if key.startswith("k") else None)
+
+    def publish(self, origin: str, key: Optional[str]):
+        self._client.publish(self._channel, f"{origin} {'*' if key is None else 'k' + key}")
+
+    def close(self):
+        self._thread.stop()
+        self._pubsub.close()
+
+
+class TieredCache(CacheHandler):
+    def __init__(
+        self,
+        l2: CacheHandler,
+        l1_threshold: int = 500,
+        l1_expire: int = 5,
+        broadcast: Optional[CacheBroadcast] = None,
+    ):
+        super().__init__(default_expire=l2._default_expire)
+        self.l1 = RamCache(threshold=l1_threshold, default_expire=l1_expire)
+        self.l2 = l2
+        self._l1_expire = l1_expire
+        self._origin = uuid4().hex
+        self._broadcast = broadcast
+        if broadcast is not None:
+            broadcast.subscribe(self._on_invalidation)
+
+    def _process_lock(self, key: str) -> Optional[CacheLock]:
+        return self.l2._process_lock(key) if isinstance(self.l2, CacheHandler) else None
+
+    def _on_invalidation(self, origin: str, key: Optional[str]):
+        if origin != self._origin:
+            self.l1.clear(key)
+
+    def _l1_duration(self, duration: Union[int, str, None]) -> int:
+        if duration is None:
+            return self._l1_expire
+        if duration == "default":
+            duration = self._default_expire
+        return min(self._l1_expire, duration)  # type: ignore
+
+    @CacheHandler._track_get_
+    def get(self, key: str) -> Any:
+        value = self.l1._get_entry(key)
+        if value is None:
+            value = self.l2._get_entry(key)
+            if value is not None:
+                self.l1.set(key, value, self._l1_expire)
+        return value
+
+    @CacheHandler._track_set_
+    def set(self, key: str, value: Any, duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None):
+        self.l2._set(key, value, duration, tags)
+        self.l1.set(key, value, self._l1_duration(duration))
+        if self._broadcast is not None:
+            self._broadcast.publish(self._origin, key)
+
+    def clear(self, key: Optional[str] = None):
+        self.l2.clear(key)
+        self.l1.clear(key)
+        if self._broadcast is not None:
+            self._broadcast.publish(self._origin, key)
+
+    @CacheHandler._track_get_many_
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        rv = self.l1._get_many_entries(keys)
+        missing = [key for key in keys if key not in rv]
+        if missing:
+            found = self.l2._get_many_entries(missing)
+            if found:
+                self.l1.set_many(found, self._l1_expire)
+            rv.update(found)
+        return rv
+
+    @CacheHandler._track_set_many_
+    def set_many(
+        self, mapping: Dict[str, Any], duration: Union[int, str, None] = "default", tags: Optional[List[str]] = None
+    ):
+        self.l2.set_many(mapping, duration, tags)
+        self.l1.set_many(mapping, self._l1_duration(duration))
+        if self._broadcast is not None:
+            for key in mapping:
+                self._broadcast.publish(self._origin, key)
+
+    def delete_many(self, keys: List[str]):
+        self.l2.delete_many(keys)
+        self.l1.delete_many(keys)
+        if self._broadcast is not None:
+            for key in keys:
+                self._broadcast.publish(self._origin, key)
+
+    def clear_tags(self, *tags: str):
+        #: first level doesn't track tags of values read from the second one, so we flush it entirely
+        self.l2.clear_tags(*tags)
+        self.l1.clear()
+        if self._broadcast is not None:
+            self._broadcast.publish(self._origin, None)
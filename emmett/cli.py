@@ -512,6 +512,79 @@ def migrations_set(info, revision, auto_confirm):
     set_revision(app, dbs, revision, auto_confirm)
 
 
+@cli.group("templates", short_help="Runs templates operations.")
+def templates_cli():
+    pass
+
+
+@templates_cli.command("compile", short_help="Compiles application templates into a bundle.")
+@click.option("--output", "-o", default=None, help="The bundle destination path.")
+@pass_script_info
+def templates_compile(info, output):
+    app = info.load_app()
+    app._load_static_manifest()
+    output = output or app.templates_bundle_path
+    if not output:
+        raise click.UsageError("No bundle path specified: set --output option or `templates_bundle` config.")
+    compiled, errors = app.templater.compile_bundle(output, app.static_manifest.digest())
+    for name, error in errors.items():
+        click.secho(f"> Skipped {name}: {error}", fg="yellow")
+    click.echo(
+        "".join(["> Compiled ", click.style(str(len(compiled)), fg="cyan", bold=True), " templates into ", output])
+    )
+
+
+@cli.group("assets", short_help="Runs static assets operations.")
+def assets_cli():
+    pass
+
+
+@assets_cli.command("manifest", short_help="Builds the fingerprinted static assets manifest.")
+@click.option("--output", "-o", default=None, help="The manifest destination path.")
+@pass_script_info
+def assets_manifest(info, output):
+    from .static import StaticManifest
+
+    app = info.load_app()
+    output = output or app.static_manifest_path
+    if not output:
+        raise click.UsageError("No manifest path specified: set --output option or `static_manifest` config.")
+    manifest = StaticManifest.build(app.static_path)
+    manifest.dump(output)
+    click.echo(
+        "".join(
+            ["> Fingerprinted ", click.style(str(len(manifest.files)), fg="cyan", bold=True), " files into ", output]
+        )
+    )
+
+
+@assets_cli.command("compress", short_help="Writes compressed sidecars of static assets.")
+@click.option(
+    "--encoding",
+    "-e",
+    "encodings",
+    multiple=True,
+    type=click.Choice(["br", "gzip"]),
+    help="The encodings to use. Defaults to gzip and br when available.",
+)
+@click.option("--min-size", type=int, default=512, help="Minimum size of files to compress (in bytes).")
+@pass_script_info
+def assets_compress(info, encodings, min_size):
+    from .static import compress_static_files
+
+    app = info.load_app()
+    if not encodings:
+        encodings = ["gzip"]
+        try:
+            import brotli  # noqa: F401
+
+            encodings.insert(0, "br")
+        except ImportError:
+            click.secho("> brotli module not found, writing gzip sidecars only", fg="yellow")
+    written = compress_static_files(app.static_path, encodings, min_size)
+    click.echo("".join(["> Written ", click.style(str(len(written)), fg="cyan", bold=True), " compressed sidecars"]))
+
+
 def main(as_module=False):
     cli.main(prog_name="python -m emmett" if as_module else None)
 
@@ -21,7 +21,11 @@ class Signals(str, Enum):
 
     after_database = "after_database"
     after_loop = "after_loop"
+    after_pool_acquire = "after_pool_acquire"
+    after_pool_close = "after_pool_close"
+    after_pool_exhausted = "after_pool_exhausted"
     after_route = "after_route"
     before_database = "before_database"
     before_route = "before_route"
     before_routes = "before_routes"
+    before_shutdown = "before_shutdown"
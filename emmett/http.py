@@ -11,6 +11,13 @@ Provides the HTTP interfaces.
 
 from __future__ import annotations
 
+import errno
+import os
+import stat
+import uuid
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+
+from emmett_core._io import loop_open_file
 from emmett_core.http.helpers import redirect as _redirect
 from emmett_core.http.response import (
     HTTPAsyncIterResponse as HTTPAsyncIter,
@@ -27,6 +34,263 @@ from .ctx import current
 
 HTTP = HTTPStringResponse
 
+
+class HTTPBufferResponse(HTTPBytes):
+    def __init__(
+        self,
+        status_code: int,
+        body: Union[bytes, bytearray, memoryview] = b"",
+        headers: Dict[str, str] = {"content-type": "text/plain"},
+        cookies: Dict[str, Any] = {},
+        chunk_size: int = 65536,
+    ):
+        super().__init__(status_code, body, headers=headers, cookies=cookies)  # type: ignore
+        self.chunk_size = chunk_size
+
+    def _get_buffer_headers(self):
+        return {"content-length": str(memoryview(self.body).nbytes)}
+
+    async def asgi(self, scope, send):
+        self._headers.update(self._get_buffer_headers())
+        await self._send_headers(send)
+        await self._send_body(send)
+
+    async def _send_body(self, send):
+        view = memoryview(self.body).cast("B")
+        for idx in range(0, max(len(view), 1), self.chunk_size):
+            chunk = view[idx : idx + self.chunk_size]
+            await send(
+                {"type": "http.response.body", "body": bytes(chunk), "more_body": idx + self.chunk_size < len(view)}
+            )
+
+    def rsgi(self, protocol):
+        self._headers.update(self._get_buffer_headers())
+        body = self.body if isinstance(self.body, bytes) else bytes(self.body)
+        protocol.response_bytes(self.status_code, list(self.rsgi_headers()), body)
+
+
+HTTPBuffer = HTTPBufferResponse
+
+
+MAX_RANGES = 16
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    #: returns the requested (start, end) byte ranges with exclusive ends,
+    #  `None` when the header is missing or invalid, an empty list when unsatisfiable
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+    specs_list = specs.split(",")
+    #: too many ranges are ignored, serving the whole representation instead
+    if len(specs_list) > MAX_RANGES:
+        return None
+    ranges = []
+    for spec in specs_list:
+        start, sep, end = spec.strip().partition("-")
+        start, end = start.strip(), end.strip()
+        if not sep or not (start or end) or (start and not start.isdigit()) or (end and not end.isdigit()):
+            return None
+        if not start:
+            if int(end) > 0:
+                ranges.append((max(size - int(end), 0), size))
+            continue
+        if end and int(end) < int(start):
+            return None
+        if int(start) < size:
+            ranges.append((int(start), min(int(end) + 1, size) if end else size))
+    #: coalesce overlapping and adjacent ranges
+    rv: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if rv and start <= rv[-1][1]:
+            rv[-1] = (rv[-1][0], max(rv[-1][1], end))
+        else:
+            rv.append((start, end))
+    return rv
+
+
+class RangeResponseMixin:
+    range_header: Optional[str]
+    if_range: Optional[str]
+
+    def _select_ranges(self, size: int, validators: Sequence[str]) -> Optional[List[Tuple[int, int]]]:
+        if self.status_code != 200:
+            return None
+        ranges = parse_range(self.range_header, size)
+        if ranges is None:
+            return None
+        #: a stale validator means the client needs the whole representation
+        if self.if_range is not None and self.if_range.strip() not in validators:
+            return None
+        return ranges
+
+    def _apply_ranges(self, size: int, ranges: Optional[List[Tuple[int, int]]]) -> List[Tuple[bytes, int, int]]:
+        #: updates status and headers, returns the (preamble, start, end) parts to send
+        self._headers["accept-ranges"] = "bytes"
+        if ranges is None:
+            self._headers["content-length"] = str(size)
+            return [(b"", 0, size)]
+        if not ranges:
+            self.status_code = 416
+            self._headers["content-range"] = f"bytes */{size}"
+            self._headers["content-length"] = "0"
+            return []
+        self.status_code = 206
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self._headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            self._headers["content-length"] = str(end - start)
+            return [(b"", start, end)]
+        boundary = uuid.uuid4().hex
+        content_type = self._headers.get("content-type", "application/octet-stream")
+        parts = []
+        for start, end in ranges:
+            preamble = (
+                f"--{boundary}\r\ncontent-type: {content_type}\r\ncontent-range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+            )
+            parts.append(((b"\r\n" if parts else b"") + preamble.encode("latin-1"), start, end))
+        parts.append((f"\r\n--{boundary}--\r\n".encode("latin-1"), 0, 0))
+        self._headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        self._headers["content-length"] = str(sum(len(preamble) + end - start for preamble, start, end in parts))
+        return parts
+
+    def _read_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
+    async def _iter_parts(self, parts: List[Tuple[bytes, int, int]]) -> AsyncIterator[bytes]:
+        for preamble, start, end in parts:
+            if preamble:
+                yield preamble
+            if end > start:
+                async for chunk in self._read_range(start, end):
+                    yield chunk
+
+    async def _send_parts(self, send, parts: List[Tuple[bytes, int, int]]):
+        async for chunk in self._iter_parts(parts):
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _stream_parts(self, protocol, parts: List[Tuple[bytes, int, int]]):
+        trx = protocol.response_stream(self.status_code, list(self.rsgi_headers()))
+        async for chunk in self._iter_parts(parts):
+            await trx.send_bytes(chunk)
+
+
+class HTTPRangeFileResponse(RangeResponseMixin, HTTPFile):
+    def __init__(
+        self,
+        file_path: str,
+        status_code: int = 200,
+        headers: Dict[str, str] = {},
+        cookies: Dict[str, Any] = {},
+        chunk_size: int = 65536,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None,
+    ):
+        super().__init__(file_path, status_code, headers=headers, cookies=cookies, chunk_size=chunk_size)
+        self.range_header = range_header
+        self.if_range = if_range
+
+    def _prepare(self) -> Union[HTTPResponse, List[Tuple[bytes, int, int]]]:
+        try:
+            stat_data = os.stat(self.file_path)
+        except IOError as e:
+            return HTTPResponse(403 if e.errno == errno.EACCES else 404)
+        if not stat.S_ISREG(stat_data.st_mode):
+            return HTTPResponse(403)
+        stat_headers = self._get_stat_headers(stat_data)
+        self._headers.update(stat_headers)
+        validators = (stat_headers["etag"], f'"{stat_headers["etag"]}"', stat_headers["last-modified"])
+        return self._apply_ranges(stat_data.st_size, self._select_ranges(stat_data.st_size, validators))
+
+    async def _read_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        async with loop_open_file(self.file_path, mode="rb") as f:
+            f.seek(start)
+            while start < end:
+                chunk = await f.read(min(self.chunk_size, end - start))
+                if not chunk:
+                    break
+                start += len(chunk)
+                yield chunk
+
+    async def asgi(self, scope, send):
+        parts = self._prepare()
+        if isinstance(parts, HTTPResponse):
+            await parts.asgi(scope, send)
+            return
+        await self._send_headers(send)
+        if self.status_code == 200 and "http.response.pathsend" in scope.get("extensions", {}):
+            await send({"type": "http.response.pathsend", "path": str(self.file_path)})
+            return
+        await self._send_parts(send, parts)
+
+    def rsgi(self, protocol):
+        parts = self._prepare()
+        if isinstance(parts, HTTPResponse):
+            return parts.rsgi(protocol)
+        if self.status_code == 200:
+            return protocol.response_file(self.status_code, list(self.rsgi_headers()), self.file_path)
+        if not parts:
+            return protocol.response_empty(self.status_code, list(self.rsgi_headers()))
+        #: `response_file_range` is only available on granian >= 2.6
+        if len(parts) == 1 and hasattr(protocol, "response_file_range"):
+            _, start, end = parts[0]
+            return protocol.response_file_range(self.status_code, list(self.rsgi_headers()), self.file_path, start, end)
+        return self._stream_parts(protocol, parts)
+
+
+class HTTPRangeIOResponse(RangeResponseMixin, HTTPIO):
+    def __init__(
+        self,
+        io_stream: BinaryIO,
+        status_code: int = 200,
+        headers: Dict[str, str] = {},
+        cookies: Dict[str, Any] = {},
+        chunk_size: int = 65536,
+        range_header: Optional[str] = None,
+        if_range: Optional[str] = None,
+    ):
+        super().__init__(io_stream, status_code, headers=headers, cookies=cookies, chunk_size=chunk_size)
+        self.range_header = range_header
+        self.if_range = if_range
+        self._offset = 0
+
+    def _prepare(self) -> List[Tuple[bytes, int, int]]:
+        offset = self.io_stream.tell()
+        size = self.io_stream.seek(0, os.SEEK_END) - offset
+        self.io_stream.seek(offset)
+        self._offset = offset
+        #: streams carry no validators, so any `If-Range` condition fails
+        return self._apply_ranges(size, self._select_ranges(size, ()))
+
+    async def _read_range(self, start: int, end: int) -> AsyncIterator[bytes]:
+        self.io_stream.seek(self._offset + start)
+        while start < end:
+            chunk = self.io_stream.read(min(self.chunk_size, end - start))
+            if not chunk:
+                break
+            start += len(chunk)
+            yield chunk
+
+    async def asgi(self, scope, send):
+        if not self.io_stream.seekable():
+            await super().asgi(scope, send)
+            return
+        parts = self._prepare()
+        await self._send_headers(send)
+        await self._send_parts(send, parts)
+
+    def rsgi(self, protocol):
+        if not self.io_stream.seekable():
+            return super().rsgi(protocol)
+        parts = self._prepare()
+        if not parts:
+            return protocol.response_empty(self.status_code, list(self.rsgi_headers()))
+        return self._stream_parts(protocol, parts)
+
+
 status_codes = {
     100: "100 CONTINUE",
     101: "101 SWITCHING PROTOCOLS",
@@ -348,6 +348,12 @@ def _initialize(adapter, *args, **kwargs):
         max_connections=adapter.db._pool_size,
         connect_timeout=adapter.db._connect_timeout,
         stale_timeout=adapter.db._keep_alive_timeout,
+        executor=adapter.db.executor,
+        pre_ping=adapter.db._pool_pre_ping,
+        min_idle=adapter.db._pool_min_idle,
+        idle_timeout=adapter.db._pool_idle_timeout,
+        reap_interval=adapter.db._pool_reap_interval,
+        max_waiters=adapter.db._pool_max_waiters,
     )
 
 
@@ -11,9 +11,11 @@ Provides base pyDAL implementation for Emmett.
 
 from __future__ import annotations
 
+import asyncio
 import copyreg
 import os
 import threading
+from datetime import datetime
 from functools import wraps
 
 from emmett_core.serializers import _json_default
@@ -21,11 +23,15 @@ from pydal import DAL as _pyDAL
 from pydal._globals import THREAD_LOCAL
 
 from .._shortcuts import uuid as _uuid
+from ..ctx import current
 from ..datastructures import sdict
 from ..extensions import Signals
+from ..helpers import abort
 from ..pipeline import Pipe
 from ..serializers import xml
 from .adapters import patch_adapter
+from .connection import DatabaseExecutor
+from .errors import MaxConnectionsExceeded
 from .helpers import ConnectionContext, TimingHandler
 from .models import MetaModel, Model
 from .objects import Field, Row, Rows, Set, Table
@@ -37,7 +43,10 @@ class DatabasePipe(Pipe):
         self.db = db
 
     async def open(self):
-        await self.db.connection_open_loop()
+        try:
+            await self.db.connection_open_loop(timeout=self.db._acquire_timeout())
+        except (MaxConnectionsExceeded, asyncio.TimeoutError):
+            abort(503)
 
     async def on_pipe_success(self):
         self.db.commit()
@@ -84,9 +93,18 @@ class Database(_pyDAL):
         return super(Database, cls).__new__(cls, uri, *args, **kwargs)
 
     def __init__(
-        self, app, config=None, pool_size=None, keep_alive_timeout=3600, connect_timeout=60, folder=None, **kwargs
+        self,
+        app,
+        config=None,
+        pool_size=None,
+        keep_alive_timeout=3600,
+        connect_timeout=60,
+        folder=None,
+        executor_workers=None,
+        **kwargs,
     ):
         app.send_signal(Signals.before_database)
+        self._app = app
         self.logger = app.log
         config = config or app.config.db
         if not config.uri:
@@ -97,6 +115,12 @@ class Database(_pyDAL):
         self._auto_migrate = self.config.get("auto_migrate", kwargs.pop("auto_migrate", False))
         self._auto_connect = self.config.get("auto_connect", kwargs.pop("auto_connect", None))
         self._use_bigint_on_id_fields = self.config.get("big_id_fields", kwargs.pop("big_id_fields", False))
+        self._pool_pre_ping = self.config.get("pool_pre_ping", kwargs.pop("pool_pre_ping", False))
+        self._pool_min_idle = self.config.get("pool_min_idle", kwargs.pop("pool_min_idle", 0))
+        self._pool_idle_timeout = self.config.get("pool_idle_timeout", kwargs.pop("pool_idle_timeout", 0))
+        self._pool_reap_interval = self.config.get("pool_reap_interval", kwargs.pop("pool_reap_interval", 30))
+        self._pool_max_waiters = self.config.get("pool_max_waiters", kwargs.pop("pool_max_waiters", 0))
+        self._pool_request_budget = self.config.get("pool_request_budget", kwargs.pop("pool_request_budget", 0))
         #: load config data
         kwargs["check_reserved"] = self.config.check_reserved or kwargs.get("check_reserved", None)
         kwargs["migrate"] = self._auto_migrate
@@ -121,6 +145,8 @@ class Database(_pyDAL):
             keep_alive_timeout if self.config.keep_alive_timeout is None else self.config.keep_alive_timeout
         )
         self._connect_timeout = connect_timeout if self.config.connect_timeout is None else self.config.connect_timeout
+        #: set the executor for blocking operations
+        self.executor = DatabaseExecutor(self.config.executor_workers or executor_workers or pool_size)
         #: add timings storage if requested
         if config.store_execution_timings:
             self.execution_handlers.append(TimingHandler)
@@ -128,6 +154,9 @@ class Database(_pyDAL):
         super(Database, self).__init__(self.config.uri, pool_size, folder, **kwargs)
         patch_adapter(self._adapter)
         Model._init_inheritable_dicts_()
+        #: warm up the pool and start its maintenance once the loop is available
+        app._extensions_listeners[str(Signals.after_loop)].append(self._start_pool_tasks)
+        app._extensions_listeners[str(Signals.before_shutdown)].append(self._stop_pool)
         app.send_signal(Signals.after_database, database=self)
 
     @property
@@ -138,6 +167,19 @@ class Database(_pyDAL):
     def execution_timings(self):
         return getattr(THREAD_LOCAL, "_emtdal_timings_", [])
 
+    def pool_stats(self):
+        return self._adapter._connection_manager.stats()
+
+    def _start_pool_tasks(self, loop=None, **kwargs):
+        self._adapter._connection_manager.start_loop_tasks(loop or asyncio.get_event_loop())
+
+    def _stop_pool(self, **kwargs):
+        self._adapter._connection_manager.disconnect_all()
+
+    def close(self):
+        super().close()
+        self.executor.shutdown(wait=False)
+
     def connection_open(self, with_transaction=True, reuse_if_open=True):
         return self._adapter.reconnect(with_transaction=with_transaction, reuse_if_open=reuse_if_open)
 
@@ -147,12 +189,24 @@ class Database(_pyDAL):
     def connection(self, with_transaction: bool = True, reuse_if_open: bool = True) -> ConnectionContext:
         return ConnectionContext(self, with_transaction=with_transaction, reuse_if_open=reuse_if_open)
 
-    def connection_open_loop(self, with_transaction=True, reuse_if_open=True):
-        return self._adapter.reconnect_loop(with_transaction=with_transaction, reuse_if_open=reuse_if_open)
+    def connection_open_loop(self, with_transaction=True, reuse_if_open=True, timeout=None):
+        return self._adapter.reconnect_loop(
+            with_transaction=with_transaction, reuse_if_open=reuse_if_open, timeout=timeout
+        )
+
+    def _acquire_timeout(self):
+        #: bounds the wait for a connection to the remaining request budget
+        request = getattr(current, "request", None)
+        if not self._pool_request_budget or request is None:
+            return None
+        return self._pool_request_budget - (datetime.utcnow() - request._now).total_seconds()
 
     def connection_close_loop(self):
         return self._adapter.close_loop()
 
+    async def run_async(self, f, *args, **kwargs):
+        return await self._adapter._connection_manager.run_loop(f, *args, **kwargs)
+
     def define_models(self, *models):
         if len(models) == 1 and isinstance(models[0], (list, tuple)):
             models = models[0]
@@ -14,20 +14,128 @@ Parts of this code are inspired to peewee
 """
 
 import asyncio
+import collections
 import contextvars
 import heapq
 import threading
 import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 
 from emmett_core.utils import cachedprop
 
 from ..ctx import current
+from ..extensions import Signals
+from ..utils import Histogram
 from .errors import MaxConnectionsExceeded
 from .transactions import _transaction
 
 
+class DatabaseExecutor:
+    #: bounded thread pool dedicated to the blocking database work
+    def __init__(self, max_workers=5, name="emmett.orm"):
+        self.max_workers = max(max_workers, 1)
+        self.name = name
+        self._executor = None
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.queued = 0
+            self.running = 0
+            self.completed = 0
+            self.wait_time = Histogram()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=self.name)
+        return self._executor
+
+    def _task(self, queued_at, f, *args, **kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait_time.observe(time.perf_counter() - queued_at)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def _on_done(self, future):
+        #: jobs cancelled before a worker picked them up never run `_task`
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    async def run(self, f, *args, **kwargs):
+        with self._lock:
+            self.queued += 1
+        future = self.executor.submit(self._task, time.perf_counter(), f, *args, **kwargs)
+        future.add_done_callback(self._on_done)
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "wait_time": self.wait_time.as_dict(),
+            }
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.acquired = 0
+            self.opened = 0
+            self.exhausted = 0
+            self.closed = {"stale": 0, "broken": 0, "idle": 0}
+            self.acquire_wait = Histogram()
+
+    def record_acquire(self, opened: bool, elapsed: float):
+        with self._lock:
+            self.acquired += 1
+            self.opened += opened
+            self.acquire_wait.observe(elapsed)
+
+    def record_exhausted(self):
+        with self._lock:
+            self.exhausted += 1
+
+    def record_close(self, reason: str):
+        with self._lock:
+            self.closed[reason] += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "opened": self.opened,
+                "exhausted": self.exhausted,
+                "closed": dict(self.closed),
+                "acquire_wait": self.acquire_wait.as_dict(),
+            }
+
+
 class ConnectionStateCtxVars:
     __slots__ = ("_connection", "_transactions", "_cursors", "_closed")
 
@@ -68,12 +176,13 @@ class ConnectionStateCtxVars:
 
 
 class ConnectionState:
-    __slots__ = ("_connection", "_transactions", "_cursors", "_closed")
+    __slots__ = ("_connection", "_transactions", "_cursors", "_closed", "_lock")
 
     def __init__(self, connection=None):
         self.connection = connection
         self._transactions = []
         self._cursors = OrderedDict()
+        self._lock = None
 
     @property
     def connection(self):
@@ -122,6 +231,14 @@ class ConnectionStateCtl:
     def closed(self):
         return self.ctx._closed
 
+    @property
+    def lock(self):
+        #: serialises the executor calls of the flow, as DB-API connections aren't thread-safe
+        ctx, loop = self.ctx, asyncio.get_running_loop()
+        if ctx._lock is None or ctx._lock[0] is not loop:
+            ctx._lock = (loop, asyncio.Lock())
+        return ctx._lock[1]
+
     def set_connection(self, connection):
         self.ctx.connection = connection
 
@@ -138,6 +255,7 @@ class ConnectionManager:
     def __init__(self, adapter, **kwargs):
         self.adapter = adapter
         self.state = self.__class__.state_cls()
+        self.executor = None
 
     def configure(self, **kwargs):
         for key, value in kwargs.items():
@@ -155,8 +273,13 @@ class ConnectionManager:
     def _connection_open_sync(self):
         return self._connector_sync(), True
 
+    async def _run_in_executor(self, f, *args, **kwargs):
+        if self.executor is None:
+            return await asyncio.get_running_loop().run_in_executor(None, partial(f, *args, **kwargs))
+        return await self.executor.run(f, *args, **kwargs)
+
     async def _connection_open_loop(self):
-        return (await self._loop.run_in_executor(None, self._connector_loop), True)
+        return (await self._run_in_executor(self._connector_loop), True)
 
     def _connection_close_sync(self, connection, *args, **kwargs):
         try:
@@ -165,10 +288,35 @@ class ConnectionManager:
             pass
 
     async def _connection_close_loop(self, connection, *args, **kwargs):
-        return await self._loop.run_in_executor(None, partial(self._connection_close_sync, connection))
+        return await self._run_in_executor(self._connection_close_sync, connection)
+
+    async def run_loop(self, f, *args, **kwargs):
+        #: runs blocking work in the executor within a copy of the current context,
+        #  so the connection state of the calling flow is preserved
+        ctx = contextvars.copy_context()
+        if self.state.closed:
+            return await self._run_in_executor(ctx.run, f, *args, **kwargs)
+        async with self.state.lock:
+            work = asyncio.ensure_future(self._run_in_executor(ctx.run, f, *args, **kwargs))
+            try:
+                return await asyncio.shield(work)
+            except asyncio.CancelledError:
+                #: the call might be running on the connection already,
+                #  so we keep the connection locked until it completes
+                await asyncio.wait([work])
+                work.exception()
+                raise
+
+    def stats(self):
+        return {}
+
+    async def connect_loop(self, timeout=None):
+        return await self._connection_open_loop()
+
+    def start_loop_tasks(self, loop):
+        pass
 
     connect_sync = _connection_open_sync
-    connect_loop = _connection_open_loop
 
     disconnect_sync = _connection_close_sync
     disconnect_loop = _connection_close_loop
@@ -183,36 +331,184 @@ class PooledConnectionManager(ConnectionManager):
         "max_connections",
         "connect_timeout",
         "stale_timeout",
+        "pre_ping",
+        "min_idle",
+        "idle_timeout",
+        "reap_interval",
+        "max_waiters",
         "connections_map",
         "connections_sync",
         "in_use",
+        "idle_since",
+        "_opening",
+        "_reserved",
+        "_stats",
+        "_fresh",
         "_lock_sync",
+        "_tasks",
+        "_closing",
     ]
 
-    def __init__(self, adapter, max_connections=5, connect_timeout=0, stale_timeout=0):
+    def __init__(
+        self,
+        adapter,
+        max_connections=5,
+        connect_timeout=0,
+        stale_timeout=0,
+        pre_ping=False,
+        min_idle=0,
+        idle_timeout=0,
+        reap_interval=30,
+        max_waiters=0,
+    ):
         super().__init__(adapter)
         self.max_connections = max(max_connections, 1)
         self.connect_timeout = connect_timeout
         self.stale_timeout = stale_timeout
+        self.pre_ping = pre_ping
+        self.min_idle = min_idle
+        self.idle_timeout = idle_timeout
+        self.reap_interval = reap_interval
+        self.max_waiters = max_waiters
         self.connections_map = {}
         self.connections_sync = []
         self.in_use = {}
+        self.idle_since = {}
+        #: slots taken by connections being opened and promised to waiters
+        self._opening = 0
+        self._reserved = 0
+        self._stats = PoolStats()
+        self._fresh = set()
         self._lock_sync = threading.RLock()
+        self._tasks = []
+        self._closing = set()
 
     @cachedprop
-    def _lock_loop(self):
-        return asyncio.Lock()
+    def connections_loop(self):
+        #: idle connections, from the oldest to the most recently released
+        return collections.deque()
 
     @cachedprop
-    def connections_loop(self):
-        return asyncio.LifoQueue()
+    def waiters_loop(self):
+        return collections.deque()
 
     def is_stale(self, timestamp):
         return (time.time() - timestamp) > self.stale_timeout
 
+    def is_idle(self, key):
+        return (time.time() - self.idle_since.get(key, time.time())) > self.idle_timeout
+
+    def _ping_sync(self, connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            #: don't leave a transaction open on the pooled connection
+            connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    def _checkout_sync(self, ts, key):
+        #: returns the pooled connection when still usable, closes it otherwise
+        self.idle_since.pop(key, None)
+        conn = self.connections_map[key]
+        reason = None
+        if self.stale_timeout and self.is_stale(ts):
+            reason = "stale"
+        elif self.pre_ping and not self._ping_sync(conn):
+            reason = "broken"
+        if reason:
+            self._connection_close_sync(self._discard(key, reason))
+            return None
+        return conn
+
+    async def _run_shielded(self, on_late, aw):
+        #: the executor work can't be interrupted, so when the calling flow gets
+        #  cancelled the result is handed to `on_late` once available
+        fut = asyncio.ensure_future(aw)
+        try:
+            return await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            fut.add_done_callback(on_late)
+            raise
+
+    def _close_later(self, connection):
+        task = asyncio.ensure_future(self._connection_close_loop(connection))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _ping_late(self, ts, key, fut):
+        #: the ping outlived its caller, put the connection back or drop it
+        if key not in self.connections_map:
+            return
+        if not fut.cancelled() and fut.exception() is None and fut.result():
+            self.idle_since[key] = time.time()
+            self._hand_off((ts, key))
+            return
+        self._close_later(self._discard(key, "broken"))
+        self._hand_off()
+
+    async def _ping_loop(self, ts, key):
+        try:
+            return await self._run_shielded(
+                partial(self._ping_late, ts, key), self._run_in_executor(self._ping_sync, self.connections_map[key])
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            return False
+
+    async def _checkout_loop(self, ts, key):
+        self.idle_since.pop(key, None)
+        conn = self.connections_map[key]
+        reason = None
+        if self.stale_timeout and self.is_stale(ts):
+            reason = "stale"
+        elif self.pre_ping and not await self._ping_loop(ts, key):
+            reason = "broken"
+        if reason:
+            conn = self._discard(key, reason)
+            try:
+                await self._connection_close_loop(conn)
+            except asyncio.CancelledError:
+                #: the slot is free, but the caller won't use it
+                self._hand_off()
+                raise
+            return None
+        return conn
+
+    def _discard(self, key, reason=None):
+        self._fresh.discard(key)
+        self.idle_since.pop(key, None)
+        if reason:
+            self._stats.record_close(reason)
+            self._signal(Signals.after_pool_close, reason=reason)
+        return self.connections_map.pop(key)
+
+    def _signal(self, signal, **kwargs):
+        app = getattr(self.adapter.db, "_app", None)
+        if app is not None:
+            app.send_signal(signal, database=self.adapter.db, **kwargs)
+
+    def _acquired(self, rv, start):
+        elapsed = time.perf_counter() - start
+        self._stats.record_acquire(rv[1], elapsed)
+        self._signal(Signals.after_pool_acquire, wait=elapsed, opened=rv[1])
+        return rv
+
+    def _exhausted(self):
+        self._stats.record_exhausted()
+        self._signal(Signals.after_pool_exhausted)
+
     def connect_sync(self):
+        start = time.perf_counter()
         if not self.connect_timeout:
-            return self._acquire_sync()
+            try:
+                return self._acquired(self._acquire_sync(), start)
+            except MaxConnectionsExceeded:
+                self._exhausted()
+                raise
         expires = time.time() + self.connect_timeout
         while time.time() < expires:
             try:
@@ -220,11 +516,20 @@ class PooledConnectionManager(ConnectionManager):
             except MaxConnectionsExceeded:
                 time.sleep(0.1)
             else:
-                return rv
+                return self._acquired(rv, start)
+        self._exhausted()
         raise MaxConnectionsExceeded()
 
-    async def connect_loop(self):
-        return await asyncio.wait_for(self._acquire_loop(), self.connect_timeout or None)
+    async def connect_loop(self, timeout=None):
+        start = time.perf_counter()
+        if self.connect_timeout:
+            timeout = self.connect_timeout if timeout is None else min(timeout, self.connect_timeout)
+        try:
+            rv = await asyncio.wait_for(self._acquire_loop(), None if timeout is None else max(timeout, 0))
+        except (asyncio.TimeoutError, MaxConnectionsExceeded):
+            self._exhausted()
+            raise
+        return self._acquired(rv, start)
 
     def _acquire_sync(self):
         _opened = False
@@ -236,10 +541,8 @@ class PooledConnectionManager(ConnectionManager):
                 ts = key = conn = None
                 break
             else:
-                if self.stale_timeout and self.is_stale(ts):
-                    self._connection_close_sync(self.connections_map.pop(key))
-                else:
-                    conn = self.connections_map[key]
+                conn = self._checkout_sync(ts, key)
+                if conn is not None:
                     break
         if conn is None:
             if len(self.connections_map) >= self.max_connections:
@@ -250,22 +553,109 @@ class PooledConnectionManager(ConnectionManager):
         self.in_use[key] = ts
         return conn, _opened
 
+    def _has_room(self):
+        return len(self.connections_map) + self._opening + self._reserved < self.max_connections
+
+    def _hand_off(self, item=None):
+        #: serves the first waiter with an idle connection, or with a free slot
+        waiters = self.waiters_loop
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                if item is None:
+                    self._reserved += 1
+                waiter.set_result(item)
+                return
+        if item is not None:
+            self.connections_loop.append(item)
+
+    async def _wait_turn(self, first):
+        waiter = asyncio.get_running_loop().create_future()
+        if first:
+            self.waiters_loop.appendleft(waiter)
+        else:
+            self.waiters_loop.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.cancelled():
+                try:
+                    self.waiters_loop.remove(waiter)
+                except ValueError:
+                    pass
+            else:
+                #: served while being cancelled, pass the turn to the next waiter
+                item = waiter.result()
+                if item is None:
+                    self._reserved -= 1
+                self._hand_off(item)
+            raise
+
+    def _open_late(self, fut):
+        #: the connection outlived its caller, make it available to the others
+        self._opening -= 1
+        if fut.cancelled() or fut.exception() is not None:
+            self._hand_off()
+            return
+        conn, _ = fut.result()
+        ts, key = time.time(), id(conn)
+        self.connections_map[key] = conn
+        self._fresh.add(key)
+        self.idle_since[key] = ts
+        self._hand_off((ts, key))
+
+    async def _open_loop(self):
+        #: the slot should be already counted in `_opening`, and it's kept until
+        #  the connection is ready, even when the caller gets cancelled
+        try:
+            conn, _ = await self._run_shielded(self._open_late, self._connection_open_loop())
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            self._opening -= 1
+            self._hand_off()
+            raise
+        self._opening -= 1
+        ts, key = time.time(), id(conn)
+        self.connections_map[key] = conn
+        return conn, ts, key
+
     async def _acquire_loop(self):
-        _opened = False
+        #: waiters are served in arrival order, and the ones already served
+        #  with an unusable connection keep their priority
+        first, _opened = False, False
         while True:
-            if len(self.connections_map) < self.max_connections:
-                async with self._lock_loop:
-                    if len(self.connections_map) < self.max_connections:
-                        conn, _opened = await self._connection_open_loop()
-                        ts, key = time.time(), id(conn)
-                        self.connections_map[key] = conn
+            if first or not self.waiters_loop:
+                if self.connections_loop:
+                    ts, key = self.connections_loop.pop()
+                    conn = await self._checkout_loop(ts, key)
+                    if conn is not None:
                         break
-            ts, key = await self.connections_loop.get()
-            if self.stale_timeout and self.is_stale(ts):
-                await self._connection_close_loop(self.connections_map.pop(key))
-            else:
-                conn = self.connections_map[key]
+                    first = True
+                    continue
+                if self._has_room():
+                    self._opening += 1
+                    conn, ts, key = await self._open_loop()
+                    _opened = True
+                    break
+            if self.max_waiters and len(self.waiters_loop) >= self.max_waiters:
+                raise MaxConnectionsExceeded()
+            item = await self._wait_turn(first)
+            first = True
+            if item is None:
+                self._reserved -= 1
+                self._opening += 1
+                conn, ts, key = await self._open_loop()
+                _opened = True
+                break
+            ts, key = item
+            conn = await self._checkout_loop(ts, key)
+            if conn is not None:
                 break
+        #: connections opened by the warm-up still need the adapter hooks
+        if key in self._fresh:
+            self._fresh.discard(key)
+            _opened = True
         self.in_use[key] = ts
         return conn, _opened
 
@@ -273,11 +663,11 @@ class PooledConnectionManager(ConnectionManager):
         key = id(connection)
         ts = self.in_use.pop(key)
         if close_connection:
-            self.connections_map.pop(key)
+            self._discard(key)
             self._connection_close_sync(connection)
         else:
             if self.stale_timeout and self.is_stale(ts):
-                self.connections_map.pop(key)
+                self._discard(key, "stale")
                 self._connection_close_sync(connection)
             else:
                 with self._lock_sync:
@@ -287,18 +677,99 @@ class PooledConnectionManager(ConnectionManager):
         key = id(connection)
         ts = self.in_use.pop(key)
         if close_connection:
-            self.connections_map.pop(key)
+            self._discard(key)
+            self._hand_off()
             await self._connection_close_loop(connection)
         else:
             if self.stale_timeout and self.is_stale(ts):
-                self.connections_map.pop(key)
+                self._discard(key, "stale")
+                self._hand_off()
                 await self._connection_close_loop(connection)
             else:
-                self.connections_loop.put_nowait((ts, key))
+                self.idle_since[key] = time.time()
+                self._hand_off((ts, key))
+
+    async def fill_loop(self):
+        #: opens new connections up to the `min_idle` floor
+        while len(self.connections_loop) < self.min_idle and self._has_room():
+            self._opening += 1
+            _, ts, key = await self._open_loop()
+            self._fresh.add(key)
+            self.idle_since[key] = time.time()
+            self._hand_off((ts, key))
+
+    async def reap_loop(self):
+        #: checks the idle connections one at a time starting from the oldest ones, so that
+        #  the others stay available meanwhile, then refills the pool
+        idle, pos = self.connections_loop, 0
+        for _ in range(len(idle)):
+            if pos >= len(idle):
+                break
+            ts, key = idle[pos]
+            del idle[pos]
+            reason = None
+            if self.stale_timeout and self.is_stale(ts):
+                reason = "stale"
+            elif self.idle_timeout and len(idle) >= self.min_idle and self.is_idle(key):
+                reason = "idle"
+            elif self.pre_ping and not await self._ping_loop(ts, key):
+                reason = "broken"
+            if reason:
+                conn = self._discard(key, reason)
+                self._hand_off()
+                await self._connection_close_loop(conn)
+            elif self.waiters_loop:
+                self._hand_off((ts, key))
+            else:
+                #: keep the original order, so the least used connections can still go idle
+                idle.insert(min(pos, len(idle)), (ts, key))
+                pos += 1
+        await self.fill_loop()
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                await self.reap_loop()
+            except Exception:
+                self.adapter.db.logger.exception("Database pool reaping failed")
+
+    def stats(self):
+        idle = len(self.connections_sync)
+        if "connections_loop" in self.__dict__:
+            idle += len(self.connections_loop)
+        return {
+            "max": self.max_connections,
+            "open": len(self.connections_map),
+            "in_use": len(self.in_use),
+            "idle": idle,
+            "waiters": len(self.waiters_loop) if "waiters_loop" in self.__dict__ else 0,
+            **self._stats.as_dict(),
+        }
+
+    def start_loop_tasks(self, loop):
+        if self._tasks:
+            return
+        if self.min_idle:
+            self._tasks.append(loop.create_task(self.fill_loop()))
+        if self.reap_interval and (self.stale_timeout or self.idle_timeout or self.min_idle or self.pre_ping):
+            self._tasks.append(loop.create_task(self._reaper()))
 
     def disconnect_all(self):
-        for connection in self.connections_map.values():
-            self.disconnect_sync(connection, close_connection=True)
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        for key in list(self.connections_map):
+            self._connection_close_sync(self._discard(key))
+        self.in_use.clear()
+        with self._lock_sync:
+            self.connections_sync.clear()
+        #: new queues will be created on next usage
+        self.__dict__.pop("connections_loop", None)
+        self.__dict__.pop("waiters_loop", None)
+        self._opening = self._reserved = 0
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
 
     def __del__(self):
         self.disconnect_all()
@@ -322,12 +793,12 @@ def _connect_sync(self, with_transaction=True, reuse_if_open=False):
     return True
 
 
-async def _connect_loop(self, with_transaction=True, reuse_if_open=False):
+async def _connect_loop(self, with_transaction=True, reuse_if_open=False, timeout=None):
     if not self._connection_manager.state.closed:
         if reuse_if_open:
             return False
         raise RuntimeError("Connection already opened.")
-    self.connection, _opened = await self._connection_manager.connect_loop()
+    self.connection, _opened = await self._connection_manager.connect_loop(timeout=timeout)
     if _opened:
         self.after_connection_hook()
     if with_transaction:
@@ -864,6 +864,10 @@ class Model(metaclass=MetaModel):
                 kwargs[local_field] = kwargs[field][foreign_field]
         return cls.table.validate_and_insert(skip_callbacks=skip_callbacks, **kwargs)
 
+    @classmethod
+    async def create_async(cls, *args, skip_callbacks=False, **kwargs):
+        return await cls.db.run_async(cls.create, *args, skip_callbacks=skip_callbacks, **kwargs)
+
     @classmethod
     def validate(cls, row, write_values: bool = False):
         inst, errors = cls._instance_(), sdict()
@@ -123,6 +123,9 @@ class Table(_Table):
                     f(row, ret)
         return ret
 
+    async def insert_async(self, skip_callbacks=False, **fields):
+        return await self._db.run_async(self.insert, skip_callbacks=skip_callbacks, **fields)
+
     def validate_and_insert(self, skip_callbacks=False, **fields):
         response, new_fields = self._validate_fields(fields)
         if not response.errors:
@@ -465,6 +468,12 @@ class Set(_Set):
             obj = self._left_join_set_builder(jdata)
         return obj._run_select_(*fields, **options)
 
+    async def select_async(self, *fields, **options):
+        return await self.db.run_async(self.select, *fields, **options)
+
+    async def count_async(self, distinct=None, cache=None):
+        return await self.db.run_async(self.count, distinct=distinct, cache=cache)
+
     def iterselect(self, *fields, **options):
         pagination = options.pop("paginate", None)
         if pagination:
@@ -500,6 +509,9 @@ class Set(_Set):
             ret and [f(self, row) for f in table._after_update]
         return ret
 
+    async def update_async(self, skip_callbacks=False, **update_fields):
+        return await self.db.run_async(self.update, skip_callbacks=skip_callbacks, **update_fields)
+
     def delete(self, skip_callbacks=False):
         table = self._get_table_from_query()
         if not skip_callbacks and any(f(self) for f in table._before_delete):
@@ -513,6 +525,9 @@ class Set(_Set):
             ret and [f(self) for f in table._after_delete]
         return ret
 
+    async def delete_async(self, skip_callbacks=False):
+        return await self.db.run_async(self.delete, skip_callbacks=skip_callbacks)
+
     def validate_and_update(self, skip_callbacks=False, **update_fields):
         table = self._get_table_from_query()
         current._dbvalidation_record_id_ = None
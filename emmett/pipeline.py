@@ -9,14 +9,20 @@ Provides the pipeline classes.
 :license: BSD-3-Clause
 """
 
+import hashlib
 import types
+from typing import Any, Dict, List, Optional, Union
 
 from emmett_core.http.helpers import redirect
+from emmett_core.http.response import HTTPBytesResponse, HTTPResponse, HTTPStringResponse
+from emmett_core.pipeline import RequestPipeline
 from emmett_core.pipeline.extras import RequirePipe as _RequirePipe
 from emmett_core.pipeline.pipe import Pipe as Pipe
 
+from ._shortcuts import hashlib_sha1
 from .ctx import current
 from .helpers import flash
+from .static import etag_matches
 
 
 class RequirePipe(_RequirePipe):
@@ -77,3 +83,109 @@ class Injector(Pipe):
         if isinstance(ctx, dict):
             self._inject(ctx)
         return ctx
+
+
+class ResponseCachePipe(Pipe):
+    __slots__ = [
+        "cache",
+        "duration",
+        "query_params",
+        "headers",
+        "cookies",
+        "language",
+        "hostname",
+        "prefix",
+        "_builders",
+    ]
+    output = "http"
+
+    def __init__(
+        self,
+        cache: Any,
+        duration: Union[int, str, None] = "default",
+        query_params: Union[bool, List[str]] = True,
+        headers: List[str] = [],
+        cookies: List[str] = [],
+        language: bool = True,
+        hostname: bool = False,
+        prefix: str = "response:",
+    ):
+        self.cache = cache
+        self.duration = duration
+        self.query_params = query_params
+        self.headers = [header.lower() for header in headers]
+        self.cookies = cookies
+        self.language = language
+        self.hostname = hostname
+        self.prefix = prefix
+        self._builders: Dict[str, Any] = {}
+
+    def _bind_route(self, rule: Any):
+        #: the route output is rendered by the pipe, using the builder the route would have used
+        if type(rule.response_builder) is not rule.router._outputs["http"]:
+            raise RuntimeError("ResponseCachePipe should precede pipes changing the route output")
+        pipes = rule.pipeline[rule.pipeline.index(self) + 1 :]
+        output_type = RequestPipeline(pipes)._output_type() or rule.output_type
+        self._builders[rule.name] = rule._make_builders(output_type)[0]
+
+    def _build_key(self) -> str:
+        request = current.request
+        parts: List[Any] = []
+        if self.query_params:
+            params = request.query_params
+            keys = sorted(params.keys()) if self.query_params is True else self.query_params
+            parts.append([(key, str(params.get(key))) for key in keys])
+        if self.headers:
+            parts.append([request.headers.get(key) for key in self.headers])
+        if self.cookies:
+            cookies = request.cookies
+            parts.append([cookies[key].value if key in cookies else None for key in self.cookies])
+        if self.language:
+            parts.append(current.language)
+        host = f"{request.host}:" if self.hostname else ""
+        return f"{self.prefix}{request.method}:{host}{request.path}:{hashlib_sha1(repr(parts)).hexdigest()}"
+
+    @staticmethod
+    def _etag_matches(etag: str) -> bool:
+        return etag_matches(current.request.headers.get("if-none-match"), etag)
+
+    def _respond(self, entry: Dict[str, Any]) -> HTTPResponse:
+        response = current.response
+        #: keep the response in sync, as head requests build their own
+        response.headers.update(entry["headers"])
+        if self._etag_matches(entry["etag"]):
+            response.status = 304
+            return HTTPResponse(304, headers={"etag": entry["etag"]}, cookies=response.cookies)
+        response.status = entry["status"]
+        return HTTPBytesResponse(entry["status"], entry["body"], headers=response.headers, cookies=response.cookies)
+
+    def _store(self, key: str, http: HTTPResponse) -> Optional[Dict[str, Any]]:
+        response = current.response
+        #: only complete successful responses are cached, and never the ones setting cookies
+        if response.status != 200 or response.cookies:
+            return None
+        if isinstance(http, HTTPStringResponse):
+            body = http.encoded_body
+        elif isinstance(http, HTTPBytesResponse):
+            body = bytes(http.body)
+        else:
+            return None
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        headers = {**dict(response.headers.items()), "etag": etag}
+        entry = {"status": response.status, "body": body, "headers": headers, "etag": etag}
+        self.cache.set(key, entry, self.duration)
+        return entry
+
+    async def pipe_request(self, next_pipe, **kwargs):
+        request = current.request
+        if request.method not in ("GET", "HEAD"):
+            return self._builders[request.name](await next_pipe(**kwargs), current.response)
+        key = self._build_key()
+        entry = self.cache.get(key)
+        if entry is not None:
+            return self._respond(entry)
+        http = self._builders[request.name](await next_pipe(**kwargs), current.response)
+        entry = self._store(key, http)
+        if entry is None:
+            return http
+        return self._respond(entry)
@@ -13,36 +13,53 @@ from __future__ import annotations
 
 from typing import Any, Dict, Tuple, Union
 
-from emmett_core.http.response import HTTPStringResponse
-from emmett_core.routing.response import ResponseProcessor
+from emmett_core.http.response import HTTPAsyncIterResponse, HTTPResponse, HTTPStringResponse
+from emmett_core.routing.response import MetaResponseBuilder, ResponseProcessor
 from renoir.errors import TemplateMissingError
 
 from ..ctx import current
-from ..helpers import load_component
-from ..html import asis
-from .urls import url
 
 
 _html_content_type = "text/html; charset=utf-8"
 
 
+def _template_context(route, output: Union[Dict[str, Any], None]) -> Dict[str, Any]:
+    rv = {} if output is None else {**output}
+    if route.template_globals is not None:
+        rv["__emt_globals__"] = route.app.templater.globals_layer(route.template_globals)
+    return rv
+
+
 class TemplateResponseBuilder(ResponseProcessor):
     def process(self, output: Union[Dict[str, Any], None], response) -> str:
         response.headers._data["content-type"] = _html_content_type
-        base_ctx = {"current": current, "url": url, "asis": asis, "load_component": load_component}
-        output = base_ctx if output is None else {**base_ctx, **output}
+        output = _template_context(self.route, output)
         try:
             return self.route.app.templater.render(self.route.template, output)
         except TemplateMissingError as exc:
             raise HTTPStringResponse(404, body="{}\n".format(exc.message), cookies=response.cookies)
 
 
+class TemplateStreamResponseBuilder(MetaResponseBuilder):
+    http_cls = HTTPAsyncIterResponse
+
+    def __call__(self, output: Union[Dict[str, Any], None], response) -> HTTPResponse:
+        if isinstance(output, HTTPResponse):
+            return output
+        response.headers._data["content-type"] = _html_content_type
+        output = _template_context(self.route, output)
+        try:
+            stream = self.route.app.templater.render_stream(self.route.template, output)
+        except TemplateMissingError as exc:
+            raise HTTPStringResponse(404, body="{}\n".format(exc.message), cookies=response.cookies)
+        return self.http_cls(stream, status_code=response.status, headers=response.headers, cookies=response.cookies)
+
+
 class SnippetResponseBuilder(ResponseProcessor):
     def process(self, output: Tuple[str, Union[Dict[str, Any], None]], response) -> str:
         response.headers._data["content-type"] = _html_content_type
         template, output = output
-        base_ctx = {"current": current, "url": url, "asis": asis, "load_component": load_component}
-        output = base_ctx if output is None else {**base_ctx, **output}
+        output = _template_context(self.route, output)
         return self.route.app.templater._render(template, f"_snippet.{current.request.name}", output)
 
 
@@ -51,12 +68,9 @@ class AutoResponseBuilder(ResponseProcessor):
         is_template, snippet = False, None
         if isinstance(output, tuple):
             snippet, output = output
-        if isinstance(output, dict):
-            is_template = True
-            output = {**{"current": current, "url": url, "asis": asis, "load_component": load_component}, **output}
-        elif output is None:
+        if isinstance(output, dict) or output is None:
             is_template = True
-            output = {"current": current, "url": url, "asis": asis, "load_component": load_component}
+            output = _template_context(self.route, output)
         if is_template:
             response.headers._data["content-type"] = _html_content_type
             if snippet is not None:
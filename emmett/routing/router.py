@@ -18,7 +18,12 @@ from emmett_core.routing.router import (
     WebsocketRouter as WebsocketRouter,
 )
 
-from .response import AutoResponseBuilder, SnippetResponseBuilder, TemplateResponseBuilder
+from .response import (
+    AutoResponseBuilder,
+    SnippetResponseBuilder,
+    TemplateResponseBuilder,
+    TemplateStreamResponseBuilder,
+)
 from .rules import HTTPRoutingRule
 
 
@@ -31,6 +36,7 @@ class HTTPRouter(_HTTPRouter):
         **{
             "auto": AutoResponseBuilder,
             "template": TemplateResponseBuilder,
+            "template_stream": TemplateStreamResponseBuilder,
             "snippet": SnippetResponseBuilder,
         },
     }
@@ -11,19 +11,24 @@ Provides routing rules definition apis.
 
 from __future__ import annotations
 
+import inspect
 import os
+from functools import wraps
+from types import MappingProxyType
 from typing import Any, Callable
 
 from emmett_core.routing.rules import HTTPRoutingRule as _HTTPRoutingRule
 
 from ..ctx import current
+from ..pipeline import ResponseCachePipe
 from .routes import HTTPRoute
 
 
 class HTTPRoutingRule(_HTTPRoutingRule):
-    __slots__ = ["injectors", "template_folder", "template_path", "template"]
+    __slots__ = ["injectors", "template_folder", "template_path", "template", "template_globals"]
     current = current
     route_cls = HTTPRoute
+    _awaitables_outputs = {"auto", "template", "template_stream"}
 
     def __init__(
         self,
@@ -41,6 +46,7 @@ class HTTPRoutingRule(_HTTPRoutingRule):
         template_path=None,
         cache=None,
         output="auto",
+        template_globals=None,
     ):
         super().__init__(
             router,
@@ -57,6 +63,8 @@ class HTTPRoutingRule(_HTTPRoutingRule):
         self.template = template
         self.template_folder = template_folder
         self.template_path = template_path or self.app.template_path
+        #: frozen, as the templater caches its layer over the app globals
+        self.template_globals = MappingProxyType(dict(template_globals)) if template_globals else None
         self.pipeline = self.pipeline + self.router.injectors + (injectors or [])
 
     def _make_builders(self, output_type):
@@ -68,4 +76,31 @@ class HTTPRoutingRule(_HTTPRoutingRule):
             self.template = f.__name__ + self.app.template_default_extension
         if self.template_folder:
             self.template = os.path.join(self.template_folder, self.template)
-        return super().__call__(f)
+        #: routes are wrapped only when awaitables are enabled, so others pay no resolution cost
+        if (
+            self.app.config.templates_awaits
+            and self.output_type in self._awaitables_outputs
+            and not inspect.isasyncgenfunction(f)
+        ):
+            #: naming relies on the original function code
+            if not self.name:
+                self.name = self.build_name(f)
+            super().__call__(self._wrap_awaitables(f))
+        else:
+            super().__call__(f)
+        for pipe in self.pipeline:
+            if isinstance(pipe, ResponseCachePipe):
+                pipe._bind_route(self)
+        return f
+
+    def _wrap_awaitables(self, f: Callable[..., Any]) -> Callable[..., Any]:
+        app = self.app
+
+        @wraps(f)
+        async def wrapped(*args, **kwargs):
+            rv = f(*args, **kwargs)
+            if inspect.isawaitable(rv):
+                rv = await rv
+            return await app.templater.resolve_context(rv, app.config.templates_concurrent_awaits)
+
+        return wrapped
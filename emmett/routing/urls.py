@@ -9,9 +9,21 @@ Provides url builder apis.
 :license: BSD-3-Clause
 """
 
-from emmett_core.routing.urls import Url
+from emmett_core.routing.urls import Url as _Url
 
 from ..ctx import current
 
 
+class Url(_Url):
+    __slots__ = []
+
+    def http(self, path, args=[], params={}, anchor=None, sign=None, scheme=None, host=None, language=None):
+        #: use fingerprinted names for static files in manifest
+        if path == "static" and args:
+            manifest = self.current.app.static_manifest
+            if manifest.files:
+                args = [manifest.url_name(args if isinstance(args, str) else "/".join(map(str, args)))]
+        return super().http(path, args, params, anchor, sign, scheme, host, language)
+
+
 url = Url(current)
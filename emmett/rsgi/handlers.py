@@ -12,16 +12,17 @@ Provides RSGI handlers.
 from __future__ import annotations
 
 import asyncio
-import os
-from typing import Awaitable, Callable
+from typing import Awaitable, Callable, Dict, Optional
 
-from emmett_core.http.response import HTTPResponse, HTTPStringResponse
+from emmett_core.http.response import HTTPBytesResponse, HTTPFileResponse, HTTPResponse, HTTPStringResponse
 from emmett_core.protocols.rsgi.handlers import HTTPHandler as _HTTPHandler, WSHandler as _WSHandler, WSTransport
 from emmett_core.protocols.rsgi.helpers import noop_response
 from emmett_core.utils import cachedprop
 
 from ..ctx import RequestContext, WSContext, current
 from ..debug import debug_handler, smart_traceback
+from ..serializers import Serializers
+from ..static import InternalAsset, etag_matches, internal_assets, resolve_static_file
 from .wrappers import Request, Response, Websocket
 
 
@@ -34,22 +35,40 @@ class HTTPHandler(_HTTPHandler):
     def error_handler(self) -> Callable[[], Awaitable[str]]:
         return self._debug_handler if self.app.debug else self.exception_handler
 
+    async def _metrics_response(self) -> HTTPBytesResponse:
+        content = Serializers.get_for("json")(self.app.metrics())
+        return HTTPBytesResponse(
+            200,
+            content.encode("utf8") if isinstance(content, str) else content,
+            headers={"content-type": "application/json", "cache-control": "no-store"},
+        )
+
     def _static_handler(self, scope, protocol, path: str) -> Awaitable[HTTPResponse]:
         #: handle internal assets
         if path.startswith("/__emmett__"):
             file_name = path[12:]
-            if not file_name:
-                return self._http_response(404)
-            static_file = os.path.join(os.path.dirname(__file__), "..", "assets", file_name)
-            if os.path.splitext(static_file)[1] == "html":
+            if file_name == "metrics" and self.app.config.metrics_endpoint:
+                return self._metrics_response()
+            asset = internal_assets().get(file_name)
+            if asset is None:
                 return self._http_response(404)
-            return self._static_response(static_file)
+            return self._internal_asset_response(asset, scope.headers.get("if-none-match"))
         #: handle app assets
         static_file, _ = self.static_matcher(path)
         if static_file:
-            return self._static_response(static_file)
+            return self._static_app_response(
+                *resolve_static_file(self.app, static_file, scope.headers.get("accept-encoding"))
+            )
         return self.dynamic_handler(scope, protocol, path)
 
+    async def _internal_asset_response(self, asset: InternalAsset, if_none_match: Optional[str]) -> HTTPResponse:
+        if etag_matches(if_none_match, asset.etag):
+            return HTTPResponse(304, headers=asset.headers_not_modified)
+        return HTTPBytesResponse(200, asset.content, headers=asset.headers)
+
+    async def _static_app_response(self, file_path: str, headers: Dict[str, str]) -> HTTPFileResponse:
+        return HTTPFileResponse(file_path, headers=headers)
+
     async def _debug_handler(self) -> str:
         current.response.headers._data["content-type"] = "text/html; charset=utf-8"
         return debug_handler(smart_traceback(self.app))
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+emmett.static
+-------------
+
+Provides utilities for application static files.
+
+:copyright: 2014 Giovanni Barillari
+:license: BSD-3-Clause
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import time
+from email.utils import formatdate
+from importlib import resources
+from types import MappingProxyType
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .libs.contenttype import contenttype
+from .parsers import Parsers
+from .serializers import Serializers
+
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+SIDECAR_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "application/manifest+json",
+    "application/wasm",
+    "application/xml",
+    "image/svg+xml",
+    "image/x-icon",
+    "image/vnd.microsoft.icon",
+}
+
+
+def _is_sidecar(filename: str, filenames: Sequence[str]) -> bool:
+    base, ext = os.path.splitext(filename)
+    return ext in (".br", ".gz") and base in filenames
+
+
+def walk_static_files(static_path: str, sidecars: bool = False) -> Iterator[str]:
+    #: yields the relative names of the files in the static folder
+    for dirpath, dirnames, filenames in os.walk(static_path):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        for filename in sorted(filenames):
+            if filename.startswith("."):
+                continue
+            if _is_sidecar(filename, filenames) != sidecars:
+                continue
+            rel = os.path.relpath(os.path.join(dirpath, filename), static_path)
+            yield rel.replace(os.sep, "/")
+
+
+def file_digest(file_path: str, chunk_size: int = 65536) -> str:
+    hasher = hashlib.blake2b(digest_size=6)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _brotli_compress(data: bytes) -> bytes:
+    try:
+        import brotli
+    except ImportError:
+        raise RuntimeError("no brotli module found")
+    return brotli.compress(data, quality=11)
+
+
+def _gzip_compress(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+_compressors = {"br": _brotli_compress, "gzip": _gzip_compress}
+
+
+def is_compressible(name: str) -> bool:
+    content_type, encoding = mimetypes.guess_type(name)
+    if encoding is not None or content_type is None:
+        return False
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+def compress_static_files(
+    static_path: str, encodings: Sequence[str] = ("br", "gzip"), min_size: int = 512
+) -> List[Tuple[str, str]]:
+    #: writes the compressed sidecars, returns the written (name, encoding) pairs
+    compressors = [(encoding, _compressors[encoding]) for encoding in encodings]
+    rv = []
+    for name in walk_static_files(static_path):
+        if not is_compressible(name):
+            continue
+        file_path = os.path.join(static_path, name)
+        with open(file_path, "rb") as f:
+            data = f.read()
+        if len(data) < min_size:
+            continue
+        for encoding, compressor in compressors:
+            sidecar_path = file_path + SIDECAR_EXTENSIONS[encoding]
+            compressed = compressor(data)
+            #: skip sidecars which don't save anything
+            if len(compressed) >= len(data):
+                if os.path.exists(sidecar_path):
+                    os.remove(sidecar_path)
+                continue
+            with open(sidecar_path, "wb") as f:
+                f.write(compressed)
+            rv.append((name, encoding))
+    return rv
+
+
+def scan_static_sidecars(static_path: str) -> Dict[str, Dict[str, str]]:
+    #: maps source files paths to their sidecars paths per encoding
+    rv: Dict[str, Dict[str, str]] = {}
+    extensions = {ext: encoding for encoding, ext in SIDECAR_EXTENSIONS.items()}
+    for name in walk_static_files(static_path, sidecars=True):
+        base, ext = os.path.splitext(name)
+        rv.setdefault(os.path.join(static_path, base), {})[extensions[ext]] = os.path.join(static_path, name)
+    return rv
+
+
+def preferred_encoding(accept_encoding: Optional[str], available: Dict[str, str]) -> Optional[str]:
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for element in accept_encoding.split(","):
+        encoding, _, params = element.strip().partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q=") and params[2:] in ("0", "0.0", "0.00", "0.000"):
+            continue
+        accepted.add(encoding.strip().lower())
+    for encoding in SIDECAR_EXTENSIONS:
+        if encoding in available and (encoding in accepted or "*" in accepted):
+            return encoding
+    return None
+
+
+def resolve_static_file(app, file_path: str, accept_encoding: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    #: returns the file to serve with the additional headers
+    headers = {}
+    if source_path := app.static_manifest.source_path(file_path):
+        file_path = source_path
+        headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+    if sidecars := app.static_sidecars.get(file_path):
+        headers["vary"] = "accept-encoding"
+        if encoding := preferred_encoding(accept_encoding, sidecars):
+            file_path = sidecars[encoding]
+            headers["content-encoding"] = encoding
+    return file_path, headers
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (
+        value.strip()[2:] if value.strip().startswith("W/") else value.strip() for value in if_none_match.split(",")
+    )
+
+
+class InternalAsset:
+    __slots__ = ["content", "etag", "headers", "headers_not_modified"]
+
+    def __init__(self, name: str, content: bytes, last_modified: str):
+        self.content = content
+        self.etag = '"' + hashlib.blake2b(content, digest_size=16).hexdigest() + '"'
+        self.headers: Mapping[str, str] = MappingProxyType(
+            {
+                "content-type": contenttype(name),
+                "content-length": str(len(content)),
+                "last-modified": last_modified,
+                "etag": self.etag,
+            }
+        )
+        self.headers_not_modified: Mapping[str, str] = MappingProxyType({"etag": self.etag})
+
+
+_internal_assets: Optional[Mapping[str, InternalAsset]] = None
+
+
+def _walk_internal_assets(root, prefix: str = "") -> Iterator[Tuple[str, bytes]]:
+    for element in root.iterdir():
+        if element.name.startswith((".", "__")):
+            continue
+        if element.is_dir():
+            yield from _walk_internal_assets(element, f"{prefix}{element.name}/")
+        elif not element.name.endswith((".py", ".pyc", ".html")):
+            yield prefix + element.name, element.read_bytes()
+
+
+def internal_assets() -> Mapping[str, InternalAsset]:
+    #: loads the bundled assets once, served from memory afterwards
+    global _internal_assets
+    if _internal_assets is None:
+        last_modified = formatdate(time.time(), usegmt=True)
+        _internal_assets = MappingProxyType(
+            {
+                name: InternalAsset(name, content, last_modified)
+                for name, content in _walk_internal_assets(resources.files("emmett.assets"))
+            }
+        )
+    return _internal_assets
+
+
+class StaticManifest:
+    __slots__ = ["files", "paths", "sources"]
+
+    def __init__(self, files: Optional[Dict[str, str]] = None, static_path: Optional[str] = None):
+        #: maps original names to fingerprinted ones
+        self.files: Dict[str, str] = files or {}
+        self.sources: Dict[str, str] = {value: key for key, value in self.files.items()}
+        self.paths: Dict[str, str] = {}
+        if static_path:
+            self.paths = {
+                os.path.join(static_path, value): os.path.join(static_path, key) for key, value in self.files.items()
+            }
+
+    @staticmethod
+    def fingerprint(name: str, digest: str) -> str:
+        base, ext = os.path.splitext(name)
+        return f"{base}.{digest}{ext}"
+
+    @classmethod
+    def build(cls, static_path: str) -> StaticManifest:
+        files = {}
+        for name in walk_static_files(static_path):
+            files[name] = cls.fingerprint(name, file_digest(os.path.join(static_path, name)))
+        return cls(files, static_path)
+
+    @classmethod
+    def load(cls, file_path: str, static_path: str) -> StaticManifest:
+        with open(file_path, "rb") as f:
+            data = Parsers.get_for("json")(f.read())
+        return cls(data.get("files", {}), static_path)
+
+    def dump(self, file_path: str):
+        data = Serializers.get_for("json")({"files": self.files})
+        with open(file_path, "wb") as f:
+            f.write(data.encode("utf8") if isinstance(data, str) else data)
+
+    def url_name(self, name: str) -> str:
+        return self.files.get(name, name)
+
+    def digest(self) -> str:
+        #: identifies the fingerprinted names, which templates bundles embed
+        data = "\n".join(f"{key}:{value}" for key, value in sorted(self.files.items()))
+        return hashlib.blake2b(data.encode("utf8"), digest_size=16).hexdigest()
+
+    def source_path(self, file_path: str) -> Optional[str]:
+        return self.paths.get(file_path)
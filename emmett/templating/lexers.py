@@ -9,6 +9,8 @@ Provides the Emmett lexers for Renoir engine.
 :license: BSD-3-Clause
 """
 
+from itertools import count
+
 from renoir import Lexer
 
 from ..ctx import current
@@ -53,4 +55,33 @@ class StaticLexer(Lexer):
             ctx.html(s)
 
 
-lexers = {"include_helpers": HelpersLexer(), "include_meta": MetaLexer(), "include_static": StaticLexer()}
+class CacheLexer(Lexer):
+    remove_line = True
+    follows_reindent_on_line_removal = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._ids = count()
+
+    def process(self, ctx, value):
+        idx = next(self._ids)
+        fragment, writer = f"__emt_fragment_{idx}__", f"__emt_fragment_writer_{idx}__"
+        #: on hits we just write the stored content
+        ctx.python_node(f"{fragment} = __emt_fragments__.get({value})")
+        ctx.python_node(f"if {fragment} is None:")
+        #: otherwise render the block into a dedicated writer and store it
+        ctx.python_node(f"{writer}, __writer__ = __writer__, __writer__.__class__()")
+        with ctx(f"__cache__{idx}"):
+            ctx.parse()
+        ctx.python_node(f"{fragment} = __emt_fragments__.set(__writer__.body.getvalue(), {value})")
+        ctx.python_node(f"__writer__ = {writer}")
+        ctx.python_node("pass")
+        ctx.python_node(f"__writer__.write({fragment})")
+
+
+lexers = {
+    "include_helpers": HelpersLexer(),
+    "include_meta": MetaLexer(),
+    "include_static": StaticLexer(),
+    "cache": CacheLexer(),
+}
@@ -9,20 +9,116 @@ Provides the Emmett implementation for Renoir engine.
 :license: BSD-3-Clause
 """
 
+import asyncio
+import builtins
+import contextvars
+import hashlib
+import inspect
+import marshal
 import os
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
-from typing import Optional, Tuple
+from importlib.util import MAGIC_NUMBER
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Callable, Dict, List, Mapping, Optional, Tuple, Union
 
+from emmett_core.utils import cachedprop
 from renoir import Renoir
 
+from ..cache import Cache, CacheHandler, RamCache
 from .lexers import lexers
 
 
+class FragmentsCache:
+    def __init__(self, handler: Optional[Union[Cache, CacheHandler]] = None, prefix: str = "fragment:"):
+        self.handler = handler
+        self.prefix = prefix
+
+    def _get_handler(self) -> Union[Cache, CacheHandler]:
+        #: lazily fallback on a private ram cache when nothing is configured
+        if self.handler is None:
+            self.handler = RamCache()
+        return self.handler
+
+    def get(self, key: str, duration: Union[int, str, None] = "default") -> Optional[str]:
+        return self._get_handler().get(self.prefix + key)
+
+    def set(self, value: str, key: str, duration: Union[int, str, None] = "default") -> str:
+        self._get_handler().set(self.prefix + key, value, duration)
+        return value
+
+    def clear(self, key: str):
+        self._get_handler().clear(self.prefix + key)
+
+
+class StreamClosed(Exception):
+    pass
+
+
+class StreamWriterMixin:
+    def __init__(self, flush: Optional[Callable[[str], None]] = None, chunk_size: int = 4096):
+        super().__init__()
+        self._flush = flush
+        self._chunk_size = chunk_size
+
+    def write(self, data):
+        super().write(data)
+        if self._flush is not None and self.body.tell() >= self._chunk_size:
+            self.flush()
+
+    def flush(self):
+        data = self.body.getvalue()
+        if data:
+            self._flush(data)
+            self.body.seek(0)
+            self.body.truncate()
+
+
 class Templater(Renoir):
+    #: threads available to streaming renders, exceeding ones wait for a free thread
+    stream_workers = 8
+
     def __init__(self, **kwargs):
         kwargs["lexers"] = lexers
         super().__init__(**kwargs)
         self._namespaces = {}
+        self.fragments = FragmentsCache()
+        #: scope shared by every render, looked up by template code as its builtins
+        self._globals: Dict[str, Any] = {**builtins.__dict__, "__emt_fragments__": self.fragments}
+        self._layers: Dict[int, Tuple[Mapping[str, Any], Dict[str, Any]]] = {}
+        self.globals: Mapping[str, Any] = MappingProxyType(self._globals)
+        self.contexts.append(self._inject_scope)
+
+    @cachedprop
+    def stream_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(max_workers=self.stream_workers, thread_name_prefix="emmett.templates")
+
+    def register_globals(self, **values: Any):
+        self._globals.update(values)
+        self._layers.clear()
+
+    def globals_layer(self, values: Optional[Mapping[str, Any]]) -> Dict[str, Any]:
+        #: returns the scope with `values` layered over the templater globals,
+        #  built once per values object until new globals get registered
+        if not values:
+            return self._globals
+        layer = self._layers.get(id(values))
+        if layer is None:
+            layer = self._layers[id(values)] = (values, {**self._globals, **values})
+        return layer[1]
+
+    def _inject_scope(self, context: Dict[str, Any]):
+        #: runs right before the template code, once the default writer is set
+        context["__builtins__"] = context.pop("__emt_globals__", self._globals)
+        writer = context.pop("__emt_writer__", None)
+        if writer is not None:
+            context["__writer__"] = writer
+
+    def _configure(self):
+        super()._configure()
+        self.stream_writer_cls = type(f"Stream{self.writer_cls.__name__}", (StreamWriterMixin, self.writer_cls), {})
 
     def _set_reload(self, value):
         self.cache.changes = value
@@ -41,6 +137,9 @@ class Templater(Renoir):
         self.indent = value
         self._configure()
 
+    def _set_cache(self, value):
+        self.fragments.handler = value
+
     def register_namespace(self, namespace: str, path: Optional[str] = None):
         path = path or self.path
         self._namespaces[namespace] = path
@@ -60,5 +159,171 @@ class Templater(Renoir):
             lambda args, loader: loader(args[0], args[1]), self.loaders.get(file_extension, []), (path, file_name)
         )
 
+    async def resolve_context(self, context: Any, concurrent: bool = False) -> Any:
+        #: awaits the awaitable values in the given context
+        if type(context) is not dict:
+            return context
+        keys = [key for key, value in context.items() if inspect.isawaitable(value)]
+        if not keys:
+            return context
+        if concurrent:
+            values = await asyncio.gather(*[context[key] for key in keys])
+        else:
+            values = [await context[key] for key in keys]
+        return {**context, **dict(zip(keys, values))}
+
+    async def render_async(
+        self, template_file_name: str, context: Optional[Dict[str, Any]] = None, concurrent: bool = False
+    ) -> str:
+        context = await self.resolve_context(context or {}, concurrent)
+        return self.render(template_file_name, context)
+
+    def render_stream(
+        self,
+        template_file_name: str,
+        context: Optional[Dict[str, Any]] = None,
+        chunk_size: int = 4096,
+        buffer_size: int = 4,
+    ) -> AsyncIterator[bytes]:
+        #: load eagerly, so missing templates raise before the response starts
+        file_path = os.path.join(*self.preload(template_file_name))
+        source = self.prerender(self.load(file_path), file_path)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        slots = threading.Semaphore(buffer_size)
+        closed = threading.Event()
+
+        def push(data: str):
+            #: blocks the render when the client is `buffer_size` chunks behind
+            slots.acquire()
+            if closed.is_set():
+                raise StreamClosed()
+            loop.call_soon_threadsafe(queue.put_nowait, data)
+
+        def render():
+            writer = self.stream_writer_cls(push, chunk_size)
+            try:
+                self._render(source, file_path, {**(context or {}), "__emt_writer__": writer})
+                writer.flush()
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+        #: the template code runs in a thread within the current context,
+        #  flushing chunks to the queue while executing
+        task = loop.run_in_executor(self.stream_executor, contextvars.copy_context().run, render)
+        return self._stream(queue, task, slots, closed)
+
+    async def _stream(
+        self, queue: asyncio.Queue, task: asyncio.Future, slots: threading.Semaphore, closed: threading.Event
+    ) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    break
+                slots.release()
+                yield chunk.encode("utf8")
+            await task
+        finally:
+            if not task.done():
+                #: the client went away, stop the render on its next flush
+                closed.set()
+                slots.release()
+                task.add_done_callback(_discard_result)
+
+    def _bundle_sources(self) -> List[str]:
+        rv = []
+        roots = [("", self.path)] + [(f"{namespace}:", path) for namespace, path in self._namespaces.items()]
+        for prefix, root in roots:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+                for filename in sorted(filenames):
+                    if filename.startswith("."):
+                        continue
+                    rel = os.path.relpath(os.path.join(dirpath, filename), root)
+                    rv.append(prefix + rel.replace(os.sep, "/"))
+        return rv
+
+    def _bundle_dependencies_hashes(self, dependencies: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        #: extended and included templates are inlined, so their sources are part of the bundle too
+        rv = {}
+        for key, (name, preload_params) in dependencies.items():
+            file_path = os.path.join(*self.preload(name, **preload_params))
+            if not os.path.isfile(file_path):
+                return None
+            rv[key] = _hash_source(self._load(file_path))
+        return rv
+
+    def _bundle_compile(self, name: str) -> Tuple[str, Dict[str, str], str, bytes, Any, Dict[str, Any]]:
+        file_path = os.path.join(*self.preload(name))
+        source = self._load(file_path)
+        prerendered = self._prerender(source, file_path)
+        parser = self.parser_cls(
+            self, prerendered, name=file_path, scope={}, lexers=self.lexers, delimiters=self.delimiters
+        )
+        code = compile(parser.render(), os.path.split(file_path)[-1], "exec")
+        return (
+            _hash_source(source),
+            self._bundle_dependencies_hashes(parser.dependencies),
+            prerendered,
+            marshal.dumps(code),
+            parser.content,
+            parser.dependencies,
+        )
+
+    def compile_bundle(self, file_path: str, static_digest: Optional[str] = None) -> Tuple[List[str], Dict[str, str]]:
+        #: compiles every template into a bundle, returns compiled names and errors.
+        #  Static urls are evaluated at compile time, so the bundle records the static manifest digest.
+        templates, errors = {}, {}
+        for name in self._bundle_sources():
+            try:
+                templates[name] = self._bundle_compile(name)
+            except Exception as exc:
+                errors[name] = str(exc) or exc.__class__.__name__
+        with open(file_path, "wb") as f:
+            pickle.dump(
+                {
+                    "magic": MAGIC_NUMBER,
+                    "parser": self.parser_cls.__name__,
+                    "static": static_digest,
+                    "templates": templates,
+                },
+                f,
+            )
+        return list(templates), errors
+
+    def load_bundle(self, file_path: str, static_digest: Optional[str] = None) -> int:
+        #: populates the caches with the bundle contents matching current sources and static manifest
+        with open(file_path, "rb") as f:
+            bundle = pickle.load(f)
+        if bundle.get("magic") != MAGIC_NUMBER or bundle.get("parser") != self.parser_cls.__name__:
+            return 0
+        if bundle.get("static") != static_digest:
+            return 0
+        rv = 0
+        for name, template in bundle["templates"].items():
+            source_hash, dependencies_hashes, prerendered, code, content, dependencies = template
+            template_path = os.path.join(*self.preload(name))
+            source = self._load(template_path) if os.path.isfile(template_path) else None
+            if source is None or _hash_source(source) != source_hash:
+                continue
+            if self._bundle_dependencies_hashes(dependencies) != dependencies_hashes:
+                continue
+            self.cache.load.set(template_path, source)
+            self.cache.prerender.set(template_path, prerendered)
+            code = marshal.loads(code)  # noqa: S302
+            self.cache.parse.set(template_path, prerendered, code, content, dependencies)
+            rv += 1
+        return rv
+
     def _no_preload(self, file_name: str, path: Optional[str] = None):
         return self._get_namespace_path_elements(file_name, path)
+
+
+def _discard_result(task: asyncio.Future):
+    if not task.cancelled():
+        task.exception()
+
+
+def _hash_source(source: str) -> str:
+    return hashlib.blake2b(source.encode("utf8"), digest_size=16).hexdigest()
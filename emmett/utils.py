@@ -11,9 +11,13 @@ Provides some utilities for Emmett.
 
 from __future__ import annotations
 
+import bisect
+import itertools
+import math
 import re
 import socket
 from datetime import date, datetime, time
+from typing import Any, Dict
 
 import pendulum
 from emmett_core.utils import cachedprop as cachedprop
@@ -106,3 +110,26 @@ def dict_to_sdict(obj):
             obj[k] = dict_to_sdict(obj[k])
         return sdict(obj)
     return obj
+
+
+class Histogram:
+    #: upper bounds (in seconds) of the latency buckets
+    buckets = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, math.inf)
+
+    def __init__(self):
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self) -> Dict[str, Any]:
+        #: buckets are cumulative, as in prometheus histograms
+        return {
+            "buckets": dict(zip((str(bound) for bound in self.buckets), itertools.accumulate(self.counts))),
+            "count": self.count,
+            "sum": self.sum,
+        }
@@ -11,9 +11,9 @@ Provides response wrappers.
 
 import os
 import re
-from typing import Any
+from typing import Any, Dict, Optional, Union
 
-from emmett_core.http.response import HTTPFileResponse, HTTPResponse
+from emmett_core.http.response import HTTPResponse
 from emmett_core.http.wrappers.response import Response as _Response
 from emmett_core.utils import cachedprop
 from pydal.exceptions import NotAuthorizedException, NotFoundException
@@ -22,6 +22,7 @@ from ..ctx import current
 from ..datastructures import sdict
 from ..helpers import abort, get_flashed_messages
 from ..html import htmlescape
+from ..http import HTTPBufferResponse, HTTPRangeFileResponse, HTTPRangeIOResponse
 
 
 _re_dbstream = re.compile(r"(?P<table>.*?)\.(?P<field>.*?)\..*")
@@ -45,9 +46,30 @@ class ResponseMixin:
     def _meta_tmpl_prop(self):
         return [(key, htmlescape(val)) for key, val in self.meta_prop.items()]
 
-    def wrap_file(self, path) -> HTTPFileResponse:
-        path = os.path.join(current.app.root_path, path)
-        return super().wrap_file(path)
+    def _range_conditions(self) -> Dict[str, Optional[str]]:
+        headers = current.request.headers
+        return {"range_header": headers.get("range"), "if_range": headers.get("if-range")}
+
+    def _wrap_path(self, path) -> HTTPRangeFileResponse:
+        return HTTPRangeFileResponse(
+            str(path), status_code=self.status, headers=self.headers, cookies=self.cookies, **self._range_conditions()
+        )
+
+    def wrap_file(self, path) -> HTTPRangeFileResponse:
+        return self._wrap_path(os.path.join(current.app.root_path, path))
+
+    def wrap_io(self, obj, chunk_size: int = 65536) -> HTTPRangeIOResponse:
+        return HTTPRangeIOResponse(
+            obj,
+            status_code=self.status,
+            headers=self.headers,
+            cookies=self.cookies,
+            chunk_size=chunk_size,
+            **self._range_conditions(),
+        )
+
+    def wrap_buffer(self, obj: Union[bytes, bytearray, memoryview], chunk_size: int = 65536) -> HTTPBufferResponse:
+        return HTTPBufferResponse(self.status, obj, headers=self.headers, cookies=self.cookies, chunk_size=chunk_size)
 
     def wrap_dbfile(self, db, name: str) -> HTTPResponse:
         items = _re_dbstream.match(name)
@@ -67,7 +89,7 @@ class ResponseMixin:
         except IOError:
             abort(404)
         if isinstance(path_or_stream, str):
-            return super().wrap_file(path_or_stream)
+            return self._wrap_path(path_or_stream)
         return self.wrap_io(path_or_stream)
 
 
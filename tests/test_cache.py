@@ -6,10 +6,29 @@ tests.cache
 Test Emmett cache module
 """
 
+import asyncio
+import contextvars
+import json
+import os
+import pickle
+import threading
+import time
+
 import pytest
 
-from emmett import App
-from emmett.cache import DiskCache
+from emmett import App, sdict
+from emmett.cache import (
+    Cache,
+    CacheCodec,
+    CacheEntry,
+    DiskCache,
+    LocalBroadcast,
+    RamCache,
+    RedisCache,
+    SharedMemoryCache,
+    TieredCache,
+)
+from emmett.orm import Database, Field, Model
 
 
 async def _await_2():
@@ -41,3 +60,697 @@ async def test_diskcache():
 
     disk_cache.clear()
     assert disk_cache.get("test") is None
+
+
+def test_diskcache_prune():
+    App(__name__)
+
+    disk_cache = DiskCache(threshold=3)
+    disk_cache.clear()
+    assert disk_cache._index.count() == 0
+
+    disk_cache.set("a", 1)
+    disk_cache.set("b", 2)
+    disk_cache.set("c", 3, -1)
+    assert disk_cache._index.count() == 3
+
+    #: expired entries are evicted first
+    disk_cache.set("d", 4)
+    assert disk_cache._index.count() == 3
+    assert disk_cache.get("c") is None
+    assert disk_cache.get("a") == 1
+
+    #: then the least recently accessed ones
+    disk_cache.set("e", 5)
+    assert disk_cache._index.count() == 3
+    assert disk_cache.get("b") is None
+    assert disk_cache.get("a") == 1
+    assert disk_cache.get("d") == 4
+    assert disk_cache.get("e") == 5
+
+    disk_cache.clear()
+    assert disk_cache._index.count() == 0
+    assert not disk_cache._list_dir()
+
+
+def test_diskcache_touches():
+    App(__name__)
+
+    disk_cache = DiskCache(threshold=2)
+    disk_cache.clear()
+    disk_cache.set("a", 1)
+    disk_cache.set("b", 2)
+    name = os.path.basename(disk_cache._get_filename("a"))
+    stored = disk_cache._index.conn.execute("SELECT acc FROM entries WHERE name = ?", (name,)).fetchone()
+
+    #: reads don't write access times to the index
+    assert disk_cache.get("a") == 1
+    assert disk_cache.get_many(["a", "b"]) == {"a": 1, "b": 2}
+    assert disk_cache._index.conn.execute("SELECT acc FROM entries WHERE name = ?", (name,)).fetchone() == stored
+    assert disk_cache.get("a") == 1
+
+    #: but they're flushed before evicting
+    disk_cache.set("c", 3)
+    assert not disk_cache._touches
+    assert disk_cache.get("b") is None
+    assert disk_cache.get("a") == 1
+    disk_cache.clear()
+
+
+def test_diskcache_raw():
+    App(__name__)
+
+    disk_cache = DiskCache(raw=True)
+    disk_cache.clear()
+
+    disk_cache.set("bytes", b"payload")
+    value = disk_cache.get("bytes")
+    assert isinstance(value, memoryview)
+    assert value == b"payload"
+
+    disk_cache.set("str", "àèìòù")
+    assert disk_cache.get("str") == "àèìòù"
+
+    disk_cache.set("obj", {"foo": "bar"})
+    assert disk_cache.get("obj") == {"foo": "bar"}
+
+    disk_cache.set("expired", b"payload", -1)
+    assert disk_cache.get("expired") is None
+
+    disk_cache.clear()
+
+
+def test_cache_codec():
+    codec = CacheCodec("json", "zlib", compress_threshold=64)
+    small = codec.dumps({"foo": "bar"})
+    assert CacheCodec.is_encoded(small)
+    assert b"bar" in small
+    assert codec.loads(small) == {"foo": "bar"}
+
+    large = codec.dumps({"foo": "bar" * 100})
+    assert len(large) < 300
+    assert codec.loads(large) == {"foo": "bar" * 100}
+
+    #: entries are decoded with the codec they were written with
+    assert CacheCodec().loads(large) == {"foo": "bar" * 100}
+
+    #: stale-while-revalidate envelopes are stored out of band
+    entry = codec.loads(codec.dumps(CacheEntry({"foo": "bar" * 100}, 10.0, 0.5)))
+    assert isinstance(entry, CacheEntry)
+    assert (entry.value, entry.expiration, entry.delta) == ({"foo": "bar" * 100}, 10.0, 0.5)
+
+    with pytest.raises(RuntimeError):
+        CacheCodec("yaml")
+
+
+def test_diskcache_codec():
+    App(__name__)
+
+    disk_cache = DiskCache(serializer="json", compression="zlib", compress_threshold=64)
+    disk_cache.clear()
+
+    disk_cache.set("small", [1, 2, 3])
+    assert disk_cache.get("small") == [1, 2, 3]
+    disk_cache.set("large", "payload" * 100)
+    assert disk_cache.get("large") == "payload" * 100
+
+    #: entries written with plain pickle stay readable
+    with open(disk_cache._get_filename("legacy"), "wb") as f:
+        pickle.dump(time.time() + 300, f, 1)
+        pickle.dump({"foo": "bar"}, f, pickle.HIGHEST_PROTOCOL)
+    assert disk_cache.get("legacy") == {"foo": "bar"}
+
+    #: changing the codec keeps existing entries readable
+    other = DiskCache()
+    assert other.get("large") == "payload" * 100
+
+    disk_cache.clear()
+
+
+def test_codec_errors():
+    App(__name__)
+    disk_cache = DiskCache(serializer="json")
+    disk_cache.clear()
+    shm_cache = SharedMemoryCache(name="emt_tests_codec", size=256 * 1024, slots=64, page_size=64 * 1024)
+    shm_cache.clear()
+
+    #: values which can't be serialized raise instead of being silently skipped
+    for handler in [disk_cache, shm_cache]:
+        with pytest.raises(TypeError):
+            handler.set("lock", threading.Lock())
+        with pytest.raises(TypeError):
+            handler.set_many({"valid": 1, "lock": threading.Lock()})
+        assert handler.get_many(["valid", "lock"]) == {}
+    assert disk_cache._index.count() == 0
+    shm_cache.unlink()
+
+    #: while ram stores them as they are
+    lock = threading.Lock()
+    ram_cache = RamCache()
+    ram_cache.set("lock", lock)
+    assert ram_cache.get("lock") is lock
+
+
+def test_rediscache_codec_errors():
+    pytest.importorskip("redis")
+    App(__name__)
+    redis_cache = RedisCache(serializer="json")
+    #: values get serialized before reaching the server
+    with pytest.raises(TypeError):
+        redis_cache.set("lock", threading.Lock())
+    with pytest.raises(TypeError):
+        redis_cache.set_many({"valid": 1, "lock": threading.Lock()})
+
+
+def test_sharedmemorycache():
+    App(__name__)
+
+    shm_cache = SharedMemoryCache(name="emt_tests_cache", size=256 * 1024, slots=64, page_size=64 * 1024)
+    shm_cache.clear()
+    try:
+        assert shm_cache("test", lambda: 2) == 2
+        assert shm_cache("test", lambda: 3, 300) == 2
+
+        shm_cache.set("test", {"foo": "bar"})
+        assert shm_cache.get("test") == {"foo": "bar"}
+
+        #: other handlers on the same segment share the data
+        other = SharedMemoryCache(name="emt_tests_cache", size=256 * 1024, slots=64, page_size=64 * 1024)
+        assert other.get("test") == {"foo": "bar"}
+        other.close()
+
+        #: while a different configuration can't be attached to it
+        with pytest.raises(RuntimeError):
+            SharedMemoryCache(name="emt_tests_cache", size=256 * 1024, slots=128, page_size=64 * 1024)
+
+        shm_cache.set("expired", 1, -1)
+        assert shm_cache.get("expired") is None
+
+        #: filling the cache evicts old entries
+        for idx in range(200):
+            shm_cache.set(f"item{idx}", "x" * 1000)
+        assert shm_cache.get("item199") == "x" * 1000
+        assert shm_cache.get("item0") is None
+
+        #: the clock hand stays on evicted slots, as shifted entries may land there
+        with shm_cache._locked():
+            slots = {}
+            for idx in range(shm_cache._slots):
+                entry = shm_cache._read_entry(idx)
+                if entry[4]:
+                    slots[shm_cache._read_key(entry[2])] = idx
+            assert shm_cache._evict(time.time())
+            remaining = set()
+            for idx in range(shm_cache._slots):
+                entry = shm_cache._read_entry(idx)
+                if entry[4]:
+                    remaining.add(shm_cache._read_key(entry[2]))
+            (evicted,) = set(slots) - remaining
+            assert shm_cache._get_header()[0] == slots[evicted]
+
+        shm_cache.clear("test")
+        assert shm_cache.get("test") is None
+        shm_cache.clear()
+        assert shm_cache.get("item199") is None
+    finally:
+        shm_cache.unlink()
+
+
+def test_sharedmemorycache_pages():
+    App(__name__)
+
+    shm_cache = SharedMemoryCache(name="emt_tests_pages", size=256 * 1024, slots=1024, page_size=64 * 1024)
+    shm_cache.clear()
+    try:
+        #: all the pages get assigned to the classes of small values
+        for idx in range(200):
+            shm_cache.set(f"small{idx}", b"x" * 900)
+            shm_cache.set(f"medium{idx}", b"y" * 1900)
+        assert shm_cache._get_header()[2] == shm_cache._pages
+
+        #: bigger values take over the page of another class
+        shm_cache.set("big", b"z" * 40000)
+        assert shm_cache.get("big") == b"z" * 40000
+        assert shm_cache.get("medium199") == b"y" * 1900
+        shm_cache.set("small", b"x" * 900)
+        assert shm_cache.get("small") == b"x" * 900
+        assert shm_cache.stats()["drops"] == 0
+
+        #: values which can't fit a page are rejected
+        with pytest.raises(ValueError):
+            shm_cache.set("big", b"z" * 100000)
+        assert shm_cache.get("big") is None
+        with pytest.raises(ValueError):
+            shm_cache.set_many({"big": b"z" * 100000})
+    finally:
+        shm_cache.unlink()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork")
+def test_sharedmemorycache_fork_lock():
+    import fcntl
+
+    App(__name__)
+
+    shm_cache = SharedMemoryCache(name="emt_tests_fork", size=256 * 1024, slots=64, page_size=64 * 1024)
+    try:
+        #: forked processes don't share the lock of their parent
+        with shm_cache._locked():
+            pid = os.fork()
+            if not pid:
+                try:
+                    fcntl.flock(shm_cache._lock_fd(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    os._exit(0)
+                os._exit(1)
+            _, status = os.waitpid(pid, 0)
+        assert os.waitstatus_to_exitcode(status) == 0
+    finally:
+        shm_cache.unlink()
+
+
+def test_tieredcache():
+    broadcast = LocalBroadcast()
+    l2 = RamCache(prefix="tiered:")
+    cache_a = TieredCache(l2, l1_expire=60, broadcast=broadcast)
+    cache_b = TieredCache(l2, l1_expire=60, broadcast=broadcast)
+
+    assert cache_a("test", lambda: 2) == 2
+    assert cache_a.l1.get("test") == 2
+    assert l2.get("test") == 2
+
+    #: reads fall through to l2 and populate l1
+    assert cache_b.l1.get("test") is None
+    assert cache_b.get("test") == 2
+    assert cache_b.l1.get("test") == 2
+
+    #: writes invalidate other processes' l1
+    cache_a.set("test", 3)
+    assert cache_b.l1.get("test") is None
+    assert cache_b.get("test") == 3
+
+    cache_b.clear()
+    assert cache_a.l1.get("test") is None
+    assert cache_a.get("test") is None
+
+
+@pytest.mark.asyncio
+async def test_get_or_set_loop_coalescing():
+    cache = Cache()
+    calls = []
+
+    async def _load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    values = await asyncio.gather(*[cache.get_or_set_loop("coalesce", _load) for _ in range(10)])
+    assert values == [1] * 10
+    assert len(calls) == 1
+
+    async def _fail():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError
+
+    results = await asyncio.gather(*[cache.get_or_set_loop("fail", _fail) for _ in range(5)], return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(calls) == 2
+    assert not cache.ram._flights
+
+
+def test_get_or_set_coalescing():
+    App(__name__)
+
+    disk_cache = DiskCache(process_lock=True)
+    disk_cache.clear()
+    calls = []
+
+    def _load():
+        calls.append(1)
+        time.sleep(0.05)
+        return len(calls)
+
+    values = []
+    threads = [
+        threading.Thread(target=lambda: values.append(disk_cache.get_or_set("coalesce", _load))) for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert values == [1] * 5
+    assert len(calls) == 1
+    assert not disk_cache._flights_sync
+    disk_cache.clear()
+
+
+def test_get_or_set_reentrant():
+    cache = RamCache()
+
+    def _load():
+        return cache.get_or_set("reentrant", lambda: 1) + 1
+
+    values = []
+    thread = threading.Thread(target=lambda: values.append(cache.get_or_set("reentrant", _load)), daemon=True)
+    thread.start()
+    thread.join(1)
+    assert values == [2]
+    assert not cache._flights_sync
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate():
+    cache = Cache()
+    calls = []
+
+    async def _load():
+        calls.append(1)
+        return len(calls)
+
+    assert await cache.get_or_set_loop("swr", _load, 0, stale_ttl=60) == 1
+    #: soft expired: stale value is served while refreshing in background
+    assert await cache.get_or_set_loop("swr", _load, 0, stale_ttl=60) == 1
+    assert "swr" in cache.ram._refreshes
+    await asyncio.sleep(0.01)
+    assert len(calls) == 2
+    assert not cache.ram._refreshes
+    assert await cache.get_or_set_loop("swr", _load, 0, stale_ttl=60) == 2
+    await asyncio.sleep(0.01)
+    assert len(calls) == 3
+
+    #: hard expired: value is computed in foreground
+    assert await cache.get_or_set_loop("swr_hard", _load, 0, stale_ttl=-1) == 4
+    assert await cache.get_or_set_loop("swr_hard", _load, 0, stale_ttl=-1) == 5
+
+    def _load_sync():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_set("swr_sync", _load_sync, 0, stale_ttl=60) == 6
+    #: sync loaders are refreshed in a thread, without blocking the loop
+    assert cache.get_or_set("swr_sync", _load_sync, 0, stale_ttl=60) == 6
+    while cache.ram._refreshes:
+        await asyncio.sleep(0.01)
+    assert len(calls) == 7
+    assert cache.get_or_set("swr_sync", _load_sync, 0, stale_ttl=60) == 7
+    while cache.ram._refreshes:
+        await asyncio.sleep(0.01)
+
+    #: plain reads never expose the envelopes
+    assert cache.ram.get("swr") == 3
+    assert cache.get_many(["swr", "swr_sync"]) == {"swr": 3, "swr_sync": 8}
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate_refresh_context():
+    App(__name__)
+    cache = Cache()
+    var = contextvars.ContextVar("var")
+    var.set("foo")
+    values = ["initial"]
+
+    def _load():
+        return values.pop() if values else var.get()
+
+    def _fail():
+        raise RuntimeError("failed")
+
+    assert cache.get_or_set("swr_ctx", _load, 0, stale_ttl=60) == "initial"
+    #: refreshes run within the context of the caller
+    assert cache.get_or_set("swr_ctx", _load, 0, stale_ttl=60) == "initial"
+    while cache.ram._refreshes:
+        await asyncio.sleep(0.01)
+    assert cache.ram.get("swr_ctx") == "foo"
+
+    #: failures keep the stale value and get counted
+    assert cache.get_or_set("swr_ctx", _fail, 0, stale_ttl=60) == "foo"
+    while cache.ram._refreshes:
+        await asyncio.sleep(0.01)
+    assert cache.ram.get("swr_ctx") == "foo"
+    assert cache.ram.stats()["refresh_errors"] == 1
+
+
+def test_stale_while_revalidate_no_loop():
+    cache = Cache()
+    calls = []
+    refreshed = threading.Event()
+
+    def _load():
+        calls.append(threading.current_thread())
+        if len(calls) > 1:
+            refreshed.set()
+        return len(calls)
+
+    assert cache.get_or_set("swr", _load, 0, stale_ttl=60) == 1
+    #: without a running loop the stale value is still served
+    assert cache.get_or_set("swr", _load, 0, stale_ttl=60) == 1
+    assert refreshed.wait(1)
+    assert calls[1] is not threading.current_thread()
+
+
+def test_early_expiration():
+    cache = Cache()
+    calls = []
+
+    def _load():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get_or_set("xfetch", _load, 300, early_beta=1) == 1
+    #: a fresh entry is not recomputed with small compute times
+    assert cache.get_or_set("xfetch", _load, 300, early_beta=1) == 1
+    #: huge compute times make early recomputation almost certain
+    cache.ram._get_entry("xfetch").delta = 10**12
+    assert cache.get_or_set("xfetch", _load, 300, early_beta=1) == 1
+    while cache.ram._refreshes:
+        time.sleep(0.01)
+    assert cache.get_or_set("xfetch", _load, 300) == 2
+
+
+def _tagged_handlers():
+    App(__name__)
+    disk_cache = DiskCache()
+    disk_cache.clear()
+    shm_cache = SharedMemoryCache(name="emt_tests_tags", size=256 * 1024, slots=64, page_size=64 * 1024)
+    shm_cache.clear()
+    return [RamCache(), disk_cache, shm_cache, TieredCache(RamCache())]
+
+
+def test_tags():
+    for handler in _tagged_handlers():
+        handler.set("post:1", 1, tags=["posts", "post:1"])
+        handler.set("post:2", 2, tags=["posts", "post:2"])
+        handler.set("user:1", 3, tags=["users"])
+        assert handler.get_or_set("list", lambda: [1, 2], tags=["posts"]) == [1, 2]
+
+        handler.clear_tags("post:1")
+        assert handler.get("post:1") is None
+        assert handler.get("post:2") == 2
+        assert handler.get("list") == [1, 2]
+
+        handler.clear_tags("posts", "missing")
+        assert handler.get("post:2") is None
+        assert handler.get("list") is None
+        assert handler.get("user:1") == 3
+
+        #: keys set again without a tag are not cleared by it
+        handler.set("user:1", 4)
+        handler.clear_tags("users")
+        assert handler.get("user:1") == 4
+
+        handler.clear()
+        if isinstance(handler, SharedMemoryCache):
+            handler.unlink()
+
+
+def test_ram_tags_index():
+    cache = RamCache(threshold=2)
+    cache.set("a", 1, tags=["letters", "a"])
+    cache.set("b", 2, -1, tags=["letters", "b"])
+    cache.set_many({"c": 3, "d": 4}, tags=["letters"])
+    cache.set("e", 5)
+    #: expired and evicted keys leave the index
+    assert set(cache._tags) == {"letters"}
+    assert cache._tags["letters"] == {"c", "d"}
+    cache.delete_many(["c"])
+    cache.clear("d")
+    assert not cache._tags
+    assert cache.get("e") == 5
+    assert not cache._key_tags
+
+
+def test_ram_bulk_replace():
+    cache = RamCache(threshold=3)
+    cache.set_many({"a": 1, "b": 2, "c": 3})
+    cache.set("a", 4)
+    cache.set_many({"b": 5, "c": 6})
+    #: replaced keys keep a single entry in the heaps
+    assert len(cache._heap_acc) == len(cache._heap_exp) == len(cache.data) == 3
+    #: stale access entries don't evict refreshed keys
+    cache.set_many({"d": 7})
+    assert cache.get_many(["a", "b", "c", "d"]) == {"b": 5, "c": 6, "d": 7}
+    cache.set_many({"e": 8, "f": 9, "g": 10})
+    assert len(cache.data) == 3
+    assert len(cache._heap_acc) == len(cache._heap_exp) == 3
+
+
+def test_bulk():
+    for handler in _tagged_handlers():
+        handler.set_many({"a": 1, "b": 2, "c": 3}, tags=["letters"])
+        handler.set("d", 4, -1)
+        assert handler.get_many(["a", "b", "c", "d", "e"]) == {"a": 1, "b": 2, "c": 3}
+        assert handler.get("b") == 2
+
+        handler.delete_many(["a", "c", "e"])
+        assert handler.get_many(["a", "b", "c"]) == {"b": 2}
+        assert handler.get_many([]) == {}
+
+        handler.clear_tags("letters")
+        assert handler.get("b") is None
+
+        handler.clear()
+        if isinstance(handler, SharedMemoryCache):
+            handler.unlink()
+
+    cache = Cache()
+    cache.set_many({"a": 1, "b": 2})
+    assert cache.get_many(["a", "b"]) == {"a": 1, "b": 2}
+    cache.delete_many(["a"])
+    assert cache.get_many(["a", "b"]) == {"b": 2}
+
+
+def test_stats():
+    ram_cache = RamCache(threshold=2)
+    ram_cache.set("a", 1)
+    ram_cache.set("b", 2, -1)
+    assert ram_cache.get("a") == 1
+    assert ram_cache.get("b") is None
+    assert ram_cache.get_many(["a", "c"]) == {"a": 1}
+    ram_cache.set("c", 3)
+    ram_cache.set("d", 4)
+    ram_cache.set("e", 5)
+    stats = ram_cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_ratio"] == 0.5
+    assert stats["sets"] == 5
+    assert stats["expirations"] == 1
+    assert stats["evictions"] == 1
+    assert stats["get_latency"]["count"] == 3
+    assert stats["get_latency"]["buckets"]["inf"] == 3
+    assert stats["set_latency"]["count"] == 5
+
+    cache = Cache(ram=ram_cache, other=RamCache())
+    assert cache.other.get("key") is None
+    cache.other.set("key", 1)
+    stats = cache.stats()
+    assert set(stats) == {"ram", "other"}
+    assert stats["other"]["misses"] == 1
+    assert stats["other"]["sets"] == 1
+
+    ram_cache._stats.reset()
+    assert ram_cache.stats()["hits"] == 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    app = App(__name__)
+    cache = Cache()
+    app.register_metrics("cache", cache.stats)
+    cache.get("key")
+    http = await app._asgi_handlers["http"]._static_handler({"emt.path": "/__emmett__/metrics"}, None, None)
+    assert http.status_code == 404
+
+    app.config.metrics_endpoint = True
+    for handler in (app._rsgi_handlers["http"], app._asgi_handlers["http"]):
+        http = await handler._metrics_response()
+        assert http.status_code == 200
+        assert http._headers["content-type"] == "application/json"
+        assert json.loads(http.body)["cache"]["ram"]["misses"] == 1
+    http = await app._rsgi_handlers["http"]._static_handler(None, None, "/__emmett__/metrics")
+    assert http.status_code == 200
+
+
+def test_diskcache_bulk_prune():
+    App(__name__)
+
+    disk_cache = DiskCache(threshold=3)
+    disk_cache.clear()
+
+    disk_cache.set("a", 1)
+    disk_cache.set_many({"b": 2, "c": 3, "d": 4})
+    assert disk_cache._index.count() == 3
+    assert disk_cache.get_many(["a", "b", "c", "d"]) == {"b": 2, "c": 3, "d": 4}
+
+    disk_cache.clear()
+
+
+class Post(Model):
+    title = Field()
+
+
+def test_tags_on_commit():
+    app = App(__name__)
+    db = Database(app, config=sdict(uri="sqlite:memory", auto_migrate=True, auto_connect=True))
+    db.define_models(Post)
+    cache = Cache()
+    cache.clear_tags_on_commit(Post, "posts", row_tags=lambda row: [f"post:{row.id}"])
+
+    post = Post.create(title="foo").id
+    db.commit()
+    cache.set("posts", [post], tags=["posts"])
+    cache.set(f"post:{post}", "foo", tags=[f"post:{post}"])
+    cache.set("other", "bar", tags=["other"])
+
+    row = Post.get(post)
+    row.title = "bar"
+    row.save()
+    assert cache.get("posts") == [post]
+    db.commit()
+    assert cache.get("posts") is None
+    assert cache.get(f"post:{post}") is None
+    assert cache.get("other") == "bar"
+
+
+def test_tags_on_commit_bulk(monkeypatch):
+    app = App(__name__)
+    db = Database(app, config=sdict(uri="sqlite:memory", auto_migrate=True, auto_connect=True))
+    db.define_models(Post)
+    #: commit callbacks flags get computed before the registration
+    Post.create(title="foo")
+    db.commit()
+
+    cache = Cache()
+    cleared = []
+    clear_tags = cache.ram.clear_tags
+    monkeypatch.setattr(cache.ram, "clear_tags", lambda *tags: cleared.append(tags) or clear_tags(*tags))
+    cache.clear_tags_on_commit(Post, "posts", row_tags=lambda row: [f"post:{row.id}"])
+
+    Post.table.insert(title="bar")
+    db.commit()
+    assert cleared == [("posts",)]
+
+    cleared.clear()
+    db(Post.id > 0).update(title="baz")
+    db.commit()
+    assert cleared == [("posts",)]
+
+    cleared.clear()
+    row = Post.first()
+    row.title = "foo"
+    row.save()
+    db.commit()
+    assert cleared == [("posts",), (f"post:{row.id}",)]
+
+    cleared.clear()
+    row.destroy()
+    db.commit()
+    assert cleared == [("posts",), (f"post:{row.id}",)]
+
+    cleared.clear()
+    cache.set("posts", [1], tags=["posts"])
+    db(Post.id > 0).delete()
+    db.commit()
+    assert cleared == [("posts",)]
+    assert cache.get("posts") is None
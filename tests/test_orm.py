@@ -1144,3 +1144,16 @@ def test_model_last(db):
         .select(orderby=~CustomPKMulti.first_name | ~CustomPKMulti.last_name, limitby=(0, 1))
         .first()
     )
+
+
+@pytest.mark.asyncio
+async def test_async_operations(db):
+    p = await Person.create_async(name="Walter", age=50)
+    assert p.id
+    assert await db.Person.insert_async(name="Jesse", age=25)
+    assert await Person.where(lambda m: m.age > 20).count_async() == 2
+    assert await Person.where(lambda m: m.name == "Jesse").update_async(age=26) == 1
+    rows = await Person.all().select_async(orderby=Person.name)
+    assert [(row.name, row.age) for row in rows] == [("Jesse", 26), ("Walter", 50)]
+    assert await Person.where(lambda m: m.name == "Jesse").delete_async() == 1
+    assert Person.all().count() == 1
@@ -6,10 +6,19 @@ tests.orm_connections
 Test pyDAL connection implementation over Emmett.
 """
 
+import asyncio
+import threading
+import time
+
 import pytest
+from helpers import current_ctx
 
 from emmett import App, sdict
+from emmett.extensions import Signals
+from emmett.http import HTTPResponse
 from emmett.orm import Database
+from emmett.orm.connection import DatabaseExecutor
+from emmett.orm.errors import MaxConnectionsExceeded
 
 
 @pytest.fixture(scope="module")
@@ -36,3 +45,335 @@ async def test_connection_ctx_loop(db):
         assert db._adapter.connection
 
     assert not db._adapter.connection
+
+
+@pytest.mark.asyncio
+async def test_connection_executor(db):
+    db.executor.reset()
+    async with db.connection():
+        assert await db.run_async(threading.current_thread) is not threading.current_thread()
+        assert await db.run_async(lambda: db._adapter.connection) is db._adapter.connection
+
+    stats = db.executor.stats()
+    assert stats["workers"] == 5
+    assert stats["queued"] == stats["running"] == 0
+    assert stats["completed"] == 2
+    assert stats["wait_time"]["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_connection_executor_cancelled():
+    executor = DatabaseExecutor(1)
+    release = threading.Event()
+    busy = asyncio.ensure_future(executor.run(release.wait))
+    await asyncio.sleep(0.05)
+    queued = asyncio.ensure_future(executor.run(lambda: None))
+    await asyncio.sleep(0)
+    assert executor.stats()["queued"] == 1
+    queued.cancel()
+    await asyncio.sleep(0)
+    release.set()
+    await busy
+
+    stats = executor.stats()
+    assert stats["queued"] == stats["running"] == 0
+    assert stats["completed"] == 1
+    executor.shutdown()
+    assert executor._executor is None
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_maintenance():
+    app = App(__name__)
+    db = Database(
+        app,
+        config=sdict(
+            uri="sqlite:memory",
+            auto_connect=False,
+            pool_size=3,
+            pool_pre_ping=True,
+            pool_min_idle=2,
+            pool_idle_timeout=60,
+        ),
+    )
+    manager = db._adapter._connection_manager
+
+    await manager.fill_loop()
+    assert len(manager.connections_loop) == 2
+    assert len(manager.connections_map) == 2
+
+    #: warmed connections still run the adapter hooks on first checkout
+    conn, opened = await manager.connect_loop()
+    assert opened
+    await manager.disconnect_loop(conn)
+
+    #: broken connections get replaced on checkout
+    conn.close()
+    async with db.connection():
+        assert db._adapter.connection is not conn
+        assert await db.run_async(lambda: db.executesql("SELECT 1")) == [(1,)]
+    assert id(conn) not in manager.connections_map
+
+    #: idle connections exceeding the floor get reaped
+    for key in manager.idle_since:
+        manager.idle_since[key] -= 120
+    await manager.fill_loop()
+    await manager.reap_loop()
+    assert len(manager.connections_loop) == 2
+
+    app.send_signal(Signals.after_loop, loop=asyncio.get_running_loop())
+    assert len(manager._tasks) == 2
+    manager.disconnect_all()
+    assert not manager._tasks
+    assert not manager.connections_map
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_reap_availability():
+    app = App(__name__)
+    db = Database(app, config=sdict(uri="sqlite:memory", auto_connect=False, pool_size=2, pool_pre_ping=True))
+    manager = db._adapter._connection_manager
+    conns = [(await manager.connect_loop())[0] for _ in range(2)]
+    for conn in conns:
+        await manager.disconnect_loop(conn)
+
+    pinging, resume = threading.Event(), threading.Event()
+
+    def ping(connection):
+        pinging.set()
+        return resume.wait(1)
+
+    manager._ping_sync = ping
+    task = asyncio.create_task(manager.reap_loop())
+    while not pinging.is_set():
+        await asyncio.sleep(0.001)
+    #: the oldest connection is being checked, the other one is still available
+    assert db.pool_stats()["idle"] == 1
+    del manager._ping_sync
+    conn, _ = await asyncio.wait_for(manager.connect_loop(), 1)
+    assert conn is conns[1]
+    await manager.disconnect_loop(conn)
+    resume.set()
+    await task
+    assert [manager.connections_map[key] for _, key in manager.connections_loop] == conns
+    stats = db.pool_stats()
+    assert (stats["open"], stats["idle"]) == (2, 2)
+    manager.disconnect_all()
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_ping_cancel():
+    app = App(__name__)
+    db = Database(app, config=sdict(uri="sqlite:memory", auto_connect=False, pool_size=1, pool_pre_ping=True))
+    manager = db._adapter._connection_manager
+    conn, _ = await manager.connect_loop()
+    await manager.disconnect_loop(conn)
+
+    async def cancel_during_ping(alive):
+        pinging, resume = threading.Event(), threading.Event()
+
+        def ping(connection):
+            pinging.set()
+            resume.wait(1)
+            return alive
+
+        manager._ping_sync = ping
+        task = asyncio.create_task(manager.connect_loop())
+        while not pinging.is_set():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        resume.set()
+        while manager._closing or db.pool_stats()["open"] + db.pool_stats()["idle"] == 1:
+            await asyncio.sleep(0.001)
+
+    #: connections still alive go back to the pool
+    await cancel_during_ping(True)
+    stats = db.pool_stats()
+    assert (stats["open"], stats["in_use"], stats["idle"]) == (1, 0, 1)
+
+    #: broken ones get closed, freeing their slot
+    await cancel_during_ping(False)
+    stats = db.pool_stats()
+    assert (stats["open"], stats["in_use"], stats["idle"]) == (0, 0, 0)
+    assert stats["closed"]["broken"] == 1
+    del manager._ping_sync
+    conn, _ = await asyncio.wait_for(manager.connect_loop(), 1)
+    await manager.disconnect_loop(conn)
+    manager.disconnect_all()
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_stats():
+    app = App(__name__)
+    db = Database(app, config=sdict(uri="sqlite:memory", auto_connect=False, pool_size=1, connect_timeout=0.1))
+    events = []
+    for signal in (Signals.after_pool_acquire, Signals.after_pool_exhausted):
+        app._extensions_listeners[signal].append(lambda signal=signal, **kwargs: events.append((signal, kwargs)))
+
+    async with db.connection():
+        stats = db.pool_stats()
+        assert (stats["open"], stats["in_use"], stats["idle"]) == (1, 1, 0)
+        with pytest.raises(asyncio.TimeoutError):
+            await db._adapter._connection_manager.connect_loop()
+
+    stats = db.pool_stats()
+    assert (stats["open"], stats["in_use"], stats["idle"], stats["waiters"]) == (1, 0, 1, 0)
+    assert (stats["acquired"], stats["opened"], stats["exhausted"]) == (1, 1, 1)
+    assert stats["acquire_wait"]["count"] == 1
+    assert [signal for signal, _ in events] == [Signals.after_pool_acquire, Signals.after_pool_exhausted]
+    assert events[0][1]["database"] is db
+    assert events[0][1]["opened"]
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_fairness():
+    app = App(__name__)
+    db = Database(app, config=sdict(uri="sqlite:memory", auto_connect=False, pool_size=1, pool_max_waiters=2))
+    manager = db._adapter._connection_manager
+    conn, _ = await manager.connect_loop()
+
+    served = []
+
+    async def acquire(name):
+        rv, _ = await manager.connect_loop()
+        served.append(name)
+        await asyncio.sleep(0)
+        await manager.disconnect_loop(rv)
+
+    #: expired deadlines
+    with pytest.raises(asyncio.TimeoutError):
+        await manager.connect_loop(timeout=0.01)
+    assert db.pool_stats()["waiters"] == 0
+
+    tasks = [asyncio.create_task(acquire(name)) for name in ("a", "b")]
+    while db.pool_stats()["waiters"] < 2:
+        await asyncio.sleep(0)
+    #: load shedding over the waiters threshold
+    with pytest.raises(MaxConnectionsExceeded):
+        await manager.connect_loop()
+    await manager.disconnect_loop(conn)
+    #: a newcomer can't overtake the waiters
+    tasks.append(asyncio.create_task(acquire("c")))
+    await asyncio.gather(*tasks)
+    assert served == ["a", "b", "c"]
+    stats = db.pool_stats()
+    assert (stats["open"], stats["idle"], stats["waiters"], stats["exhausted"]) == (1, 1, 0, 2)
+
+    #: requests waiting for a connection get a 503
+    conn, _ = await manager.connect_loop()
+    db._pool_request_budget = 0.01
+    with current_ctx("/"):
+        with pytest.raises(HTTPResponse) as exc:
+            await db.pipe.open()
+        assert exc.value.status_code == 503
+    await manager.disconnect_loop(conn)
+    manager.disconnect_all()
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_open_cancel():
+    app = App(__name__)
+    db = Database(app, config=sdict(uri="sqlite:memory", auto_connect=False, pool_size=1))
+    manager = db._adapter._connection_manager
+    opening, resume = threading.Event(), threading.Event()
+
+    def connector():
+        opening.set()
+        resume.wait(1)
+        return db._adapter.connector()
+
+    manager._connector_loop = connector
+    task = asyncio.create_task(manager.connect_loop())
+    while not opening.is_set():
+        await asyncio.sleep(0.001)
+    waiter = asyncio.create_task(manager.connect_loop())
+    while db.pool_stats()["waiters"] < 1:
+        await asyncio.sleep(0)
+    #: the slot is kept by the pending connection, and handed to the waiter once ready
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    resume.set()
+    conn, opened = await asyncio.wait_for(waiter, 1)
+    assert opened
+    stats = db.pool_stats()
+    assert (stats["open"], stats["in_use"], stats["idle"], stats["waiters"]) == (1, 1, 0, 0)
+    await manager.disconnect_loop(conn)
+
+    #: with nobody waiting the late connection goes to the pool
+    opening.clear()
+    resume.clear()
+    conn, _ = await manager.connect_loop()
+    await manager.disconnect_loop(conn, close_connection=True)
+    task = asyncio.create_task(manager.connect_loop())
+    while not opening.is_set():
+        await asyncio.sleep(0.001)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    resume.set()
+    while manager._opening:
+        await asyncio.sleep(0.001)
+    stats = db.pool_stats()
+    assert (stats["open"], stats["in_use"], stats["idle"]) == (1, 0, 1)
+    conn, opened = await manager.connect_loop()
+    assert opened
+    await manager.disconnect_loop(conn)
+    manager.disconnect_all()
+
+
+@pytest.mark.asyncio
+async def test_connection_pool_asgi_lifespan():
+    app = App(__name__)
+    db = Database(app, config=sdict(uri="sqlite:memory", auto_connect=False, pool_size=2, pool_min_idle=1))
+    manager = db._adapter._connection_manager
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if message["type"] == "lifespan.startup.complete":
+            await manager.fill_loop()
+            assert manager._tasks
+            assert manager.connections_map
+        sent.append(message["type"])
+
+    await app({"type": "lifespan"}, receive, send)
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert not manager._tasks
+    assert not manager.connections_map
+
+
+@pytest.mark.asyncio
+async def test_connection_executor_serialised(db):
+    lock = threading.Lock()
+    running, overlaps = [], []
+
+    def work(value):
+        with lock:
+            running.append(value)
+            overlaps.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(value)
+        return db.executesql(f"SELECT {value}")[0][0]
+
+    #: calls sharing the flow connection run one at a time
+    async with db.connection():
+        assert await asyncio.gather(*[db.run_async(work, idx) for idx in range(5)]) == list(range(5))
+    assert overlaps == [1] * 5
+
+    #: a cancelled call keeps the connection locked until it completes
+    overlaps.clear()
+    async with db.connection():
+        task = asyncio.ensure_future(db.run_async(work, 0))
+        await asyncio.sleep(0.005)
+        task.cancel()
+        assert await db.run_async(work, 1) == 1
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    assert overlaps == [1, 1]
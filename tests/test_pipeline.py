@@ -13,10 +13,11 @@ import pytest
 from helpers import current_ctx as _current_ctx, ws_ctx as _ws_ctx
 
 from emmett import App, abort, request, websocket
+from emmett.cache import RamCache
 from emmett.ctx import current
 from emmett.http import HTTP
 from emmett.parsers import Parsers
-from emmett.pipeline import Injector, Pipe
+from emmett.pipeline import Injector, Pipe, ResponseCachePipe
 from emmett.serializers import Serializers
 
 
@@ -902,3 +903,85 @@ async def test_injectors(app):
         assert env.staticm("test") == "test"
         assert env.boundm("test") == ("bar", "test")
         assert env.prop == "baz"
+
+
+class StrOutputPipe(Pipe):
+    output = "str"
+
+    async def pipe_request(self, next_pipe, **kwargs):
+        return str(await next_pipe(**kwargs))
+
+
+def test_response_cache_pipe():
+    app = App(__name__)
+    cache = RamCache()
+    calls = []
+
+    @app.route(pipeline=[ResponseCachePipe(cache, query_params=["page"], headers=["x-tenant"])], output="str")
+    async def cached_str():
+        calls.append("str")
+        return f"page {request.query_params.page}"
+
+    @app.route(pipeline=[ResponseCachePipe(cache)], template="test.html")
+    async def cached_tpl():
+        calls.append("tpl")
+        return {"posts": []}
+
+    @app.route(pipeline=[ResponseCachePipe(cache, hostname=True)], output="str")
+    async def cached_host():
+        calls.append("host")
+        return request.host
+
+    @app.route(methods=["get", "post"], pipeline=[ResponseCachePipe(cache)], output="str")
+    async def cached_post():
+        calls.append("post")
+        return "post"
+
+    client = app.test_client()
+
+    rv = client.get("/cached_str?page=1&other=1")
+    assert rv.status == 200
+    assert rv.data == "page 1"
+    etag = rv.headers["etag"]
+    #: keys not in vary list don't matter
+    rv = client.get("/cached_str?page=1&other=2")
+    assert rv.data == "page 1"
+    assert rv.headers["etag"] == etag
+    assert calls == ["str"]
+    rv = client.get("/cached_str?page=2")
+    assert rv.data == "page 2"
+    rv = client.get("/cached_str?page=1", headers=[("x-tenant", "foo")])
+    assert rv.data == "page 1"
+    assert calls == ["str", "str", "str"]
+
+    rv = client.get("/cached_str?page=1", headers=[("if-none-match", etag)])
+    assert rv.status == 304
+    assert rv.data == ""
+    assert calls == ["str", "str", "str"]
+
+    rv = client.get("/cached_tpl")
+    assert rv.status == 200
+    assert rv.headers["content-type"] == "text/html; charset=utf-8"
+    body = rv.data
+    rv = client.get("/cached_tpl")
+    assert rv.data == body
+    assert rv.headers["content-type"] == "text/html; charset=utf-8"
+    assert calls.count("tpl") == 1
+
+    rv = client.get("/cached_host", base_url="http://a.example.com")
+    assert rv.data == "a.example.com"
+    rv = client.get("/cached_host", base_url="http://b.example.com")
+    assert rv.data == "b.example.com"
+    rv = client.get("/cached_host", base_url="http://a.example.com")
+    assert rv.data == "a.example.com"
+    assert calls.count("host") == 2
+
+    client.post("/cached_post")
+    client.post("/cached_post")
+    assert calls.count("post") == 2
+
+    with pytest.raises(RuntimeError):
+
+        @app.route(pipeline=[StrOutputPipe(), ResponseCachePipe(cache)])
+        async def cached_wrong():
+            return {}
@@ -6,7 +6,9 @@ tests.routing
 Test Emmett routing module
 """
 
+import os
 from contextlib import contextmanager
+from types import SimpleNamespace
 
 import pendulum
 import pytest
@@ -16,6 +18,7 @@ from helpers import FakeRequestContext
 from emmett import App, abort, url
 from emmett.ctx import current
 from emmett.http import HTTPResponse
+from emmett.static import StaticManifest, compress_static_files, internal_assets
 
 
 @contextmanager
@@ -221,6 +224,110 @@ def test_static_url(app):
     assert link == "/it/static/_1.0.0/js/foo.js"
 
 
+@pytest.mark.asyncio
+async def test_static_manifest(app, tmp_path):
+    os.makedirs(tmp_path / "static" / "js")
+    (tmp_path / "static" / "js" / "foo.js").write_text("var foo;")
+    static_app = App(__name__, root_path=str(tmp_path))
+    try:
+        manifest = StaticManifest.build(static_app.static_path)
+        fingerprinted = manifest.files["js/foo.js"]
+        assert fingerprinted.startswith("js/foo.") and fingerprinted.endswith(".js")
+        manifest.dump(static_app.static_manifest_path)
+        assert url("static", "js/foo.js") == "/static/js/foo.js"
+        static_app._load_static_manifest()
+        assert url("static", "js/foo.js") == f"/static/{fingerprinted}"
+        assert url("static", "js/bar.js") == "/static/js/bar.js"
+
+        source = os.path.join(static_app.static_path, "js/foo.js")
+        http = await static_app._asgi_handlers["http"]._static_handler(
+            {"emt.path": f"/static/{fingerprinted}", "headers": []}, None, None
+        )
+        assert http.file_path == source
+        assert http._headers["cache-control"] == "public, max-age=31536000, immutable"
+        http = await static_app._rsgi_handlers["http"]._static_handler(
+            SimpleNamespace(headers={}), None, f"/static/{fingerprinted}"
+        )
+        assert http.file_path == source
+        assert http._headers["cache-control"] == "public, max-age=31536000, immutable"
+        http = await static_app._rsgi_handlers["http"]._static_handler(
+            SimpleNamespace(headers={}), None, "/static/js/foo.js"
+        )
+        assert "cache-control" not in http._headers
+    finally:
+        app._register_with_ctx()
+
+
+@pytest.mark.asyncio
+async def test_static_precompressed(app, tmp_path):
+    os.makedirs(tmp_path / "static")
+    (tmp_path / "static" / "style.css").write_text("body { color: red; }\n" * 100)
+    (tmp_path / "static" / "image.png").write_bytes(b"\x89PNG" * 200)
+    static_app = App(__name__, root_path=str(tmp_path))
+    try:
+        written = compress_static_files(static_app.static_path, ["gzip"])
+        assert written == [("style.css", "gzip")]
+        static_app._load_static_sidecars()
+        source = os.path.join(static_app.static_path, "style.css")
+        assert static_app.static_sidecars == {source: {"gzip": source + ".gz"}}
+
+        handler = static_app._rsgi_handlers["http"]
+        http = await handler._static_handler(
+            SimpleNamespace(headers={"accept-encoding": "br, gzip;q=0.8"}), None, "/static/style.css"
+        )
+        assert http.file_path == source + ".gz"
+        assert http._headers["content-encoding"] == "gzip"
+        assert http._headers["vary"] == "accept-encoding"
+        http = await handler._static_handler(
+            SimpleNamespace(headers={"accept-encoding": "gzip;q=0"}), None, "/static/style.css"
+        )
+        assert http.file_path == source
+        assert "content-encoding" not in http._headers
+        assert http._headers["vary"] == "accept-encoding"
+        http = await static_app._asgi_handlers["http"]._static_handler(
+            {"emt.path": "/static/style.css", "headers": [(b"accept-encoding", b"gzip, deflate")]}, None, None
+        )
+        assert http.file_path == source + ".gz"
+        http = await handler._static_handler(SimpleNamespace(headers={}), None, "/static/image.png")
+        assert "vary" not in http._headers
+    finally:
+        app._register_with_ctx()
+
+
+@pytest.mark.asyncio
+async def test_internal_assets(app):
+    assets = internal_assets()
+    assert internal_assets() is assets
+    assert "debug/view.html" not in assets
+    asset = assets["helpers.js"]
+    assert asset.headers["content-length"] == str(len(asset.content))
+    assert asset.headers["content-type"] == "application/javascript"
+
+    handler = app._rsgi_handlers["http"]
+    http = await handler._static_handler(SimpleNamespace(headers={}), None, "/__emmett__/helpers.js")
+    assert http.status_code == 200
+    assert http.body == asset.content
+    assert http._headers["etag"] == asset.etag
+    http = await handler._static_handler(
+        SimpleNamespace(headers={"if-none-match": f'W/"foo", {asset.etag}'}), None, "/__emmett__/helpers.js"
+    )
+    assert http.status_code == 304
+    assert http._headers == {"etag": asset.etag}
+    http = await handler._static_handler(SimpleNamespace(headers={}), None, "/__emmett__/debug/view.html")
+    assert http.status_code == 404
+
+    handler = app._asgi_handlers["http"]
+    http = await handler._static_handler(
+        {"emt.path": "/__emmett__/debug/shCore.css", "headers": [(b"if-none-match", b'"foo"')]}, None, None
+    )
+    assert http.status_code == 200
+    assert http.body == assets["debug/shCore.css"].content
+    http = await handler._static_handler(
+        {"emt.path": "/__emmett__/debug/shCore.css", "headers": [(b"if-none-match", b"*")]}, None, None
+    )
+    assert http.status_code == 304
+
+
 def test_module_url(app):
     with current_ctx(app, "/") as ctx:
         ctx.request.language = "it"
@@ -6,10 +6,14 @@ tests.templates
 Test Emmett templating module
 """
 
+import asyncio
+import os
+
 import pytest
 from helpers import current_ctx
 
 from emmett import App
+from emmett.static import StaticManifest
 
 
 @pytest.fixture(scope="module")
@@ -54,6 +58,39 @@ def test_static(app):
     )
 
 
+def test_globals(tmp_path):
+    (tmp_path / "greet.html").write_text("{{=greeting}} {{=name}}")
+    app = App(__name__, template_folder=str(tmp_path))
+    app.config.templates_auto_reload = True
+    templater = app.templater
+    templater.register_globals(greeting="hello")
+    r = templater._render(source="{{=greeting}} {{=url('static', 'foo.css')}}")
+    assert r == "hello /static/foo.css"
+    r = templater._render(source="{{=greeting}}", context={"greeting": "hi"})
+    assert r == "hi"
+    with pytest.raises(TypeError):
+        templater.globals["greeting"] = "hi"
+
+    @app.route("/greet", template="greet.html")
+    def greet():
+        return {}
+
+    @app.route("/greet_route", template="greet.html", template_globals={"greeting": "hey"})
+    def greet_route():
+        return {"name": "route"}
+
+    @app.route("/greet_stream", template="greet.html", template_globals={"greeting": "hey"}, output="template_stream")
+    async def greet_stream():
+        return {}
+
+    #: route globals are layered over the app ones, even when registered later
+    templater.register_globals(name="app")
+    client = app.test_client()
+    assert client.get("/greet").data == "hello app"
+    assert client.get("/greet_route").data == "hey route"
+    assert client.get("/greet_stream").data == "hey app"
+
+
 rendered_value = """
 <!DOCTYPE html>
 <html>
@@ -97,3 +134,165 @@ def test_render(app):
         assert "\n".join([l.strip() for l in r.splitlines() if l.strip()]) == "\n".join(
             [l.strip() for l in rendered_value[1:].splitlines()]
         )
+
+
+def test_cache_fragment(app):
+    templater = app.templater
+    s = "<ul>{{cache 'posts', 60}}{{for post in posts:}}<li>{{=post}}</li>{{pass}}{{end}}</ul>"
+    r = templater._render(source=s, context={"posts": ["foo", "bar"]})
+    assert r == "<ul><li>foo</li><li>bar</li></ul>"
+    r = templater._render(source=s, context={"posts": []})
+    assert r == "<ul><li>foo</li><li>bar</li></ul>"
+    templater.fragments.clear("posts")
+    r = templater._render(source=s, context={"posts": ["baz"]})
+    assert r == "<ul><li>baz</li></ul>"
+
+
+def test_bundle(app, tmp_path):
+    bundle_path = str(tmp_path / "templates.bundle")
+    compiled, errors = app.templater.compile_bundle(bundle_path)
+    assert "test.html" in compiled
+    assert "layout.html" in errors
+
+    bundled_app = App(__name__)
+    bundled_app.config.templates_escape = "all"
+    assert bundled_app.templater.load_bundle(bundle_path) == len(compiled)
+    file_path = os.path.join(bundled_app.template_path, "test.html")
+    assert file_path in bundled_app.templater.cache.parse.data
+    with current_ctx("/", bundled_app) as ctx:
+        ctx.language = "it"
+        r = bundled_app.templater.render("test.html", {"current": ctx, "posts": [{"title": "foo"}, {"title": "bar"}]})
+        assert "\n".join([l.strip() for l in r.splitlines() if l.strip()]) == "\n".join(
+            [l.strip() for l in rendered_value[1:].splitlines()]
+        )
+
+
+def test_bundle_dependencies(tmp_path):
+    bundle_path = str(tmp_path / "templates.bundle")
+    templates_path = tmp_path / "templates"
+    templates_path.mkdir()
+    (templates_path / "layout.html").write_text("<main>{{block content}}{{end}}</main>")
+    (templates_path / "page.html").write_text("{{extend 'layout.html'}}{{block content}}page{{end}}")
+    app = App(__name__, template_folder=str(templates_path))
+    compiled, _ = app.templater.compile_bundle(bundle_path)
+    assert "page.html" in compiled
+    assert App(__name__, template_folder=str(templates_path)).templater.load_bundle(bundle_path) == len(compiled)
+
+    #: templates inlining a changed layout are compiled again
+    (templates_path / "layout.html").write_text("<article>{{block content}}{{end}}</article>")
+    bundled_app = App(__name__, template_folder=str(templates_path))
+    assert bundled_app.templater.load_bundle(bundle_path) == len(compiled) - 2
+    assert bundled_app.templater.render("page.html") == "<article>page</article>"
+
+
+def test_bundle_static_manifest(app, tmp_path):
+    bundle_path = str(tmp_path / "templates.bundle")
+    manifest = StaticManifest({"js/foo.js": "js/foo.abc.js"})
+    compiled, _ = app.templater.compile_bundle(bundle_path, manifest.digest())
+    assert App(__name__).templater.load_bundle(bundle_path, manifest.digest()) == len(compiled)
+
+    #: static urls are compiled in the bundle, so a different manifest invalidates it
+    manifest = StaticManifest({"js/foo.js": "js/foo.def.js"})
+    assert App(__name__).templater.load_bundle(bundle_path, manifest.digest()) == 0
+    assert App(__name__).templater.load_bundle(bundle_path) == 0
+
+
+@pytest.mark.asyncio
+async def test_render_stream(app):
+    with current_ctx("/", app) as ctx:
+        ctx.language = "it"
+        context = {"current": ctx, "posts": [{"title": "foo"}, {"title": "bar"}]}
+        chunks = [chunk async for chunk in app.templater.render_stream("test.html", context, chunk_size=64)]
+    assert len(chunks) > 1
+    r = b"".join(chunks).decode("utf8")
+    assert "\n".join([l.strip() for l in r.splitlines() if l.strip()]) == "\n".join(
+        [l.strip() for l in rendered_value[1:].splitlines()]
+    )
+
+
+@pytest.mark.asyncio
+async def test_render_stream_backpressure(tmp_path):
+    (tmp_path / "big.html").write_text("{{for i in range(1000):}}{{=progress.append(i) or 'x' * 10}}{{pass}}")
+    templater = App(__name__, template_folder=str(tmp_path)).templater
+    progress = []
+    stream = templater.render_stream("big.html", {"progress": progress}, chunk_size=10, buffer_size=2)
+    assert await stream.__anext__() == b"x" * 10
+    await asyncio.sleep(0.05)
+    #: the render waits for the client to consume the buffered chunks
+    assert len(progress) < 10
+
+    #: and stops when the client goes away
+    await stream.aclose()
+    await asyncio.sleep(0.05)
+    rendered = len(progress)
+    await asyncio.sleep(0.05)
+    assert len(progress) == rendered < 10
+
+
+def test_render_stream_route(app):
+    @app.route("/stream", output="template_stream", template="test.html")
+    async def stream():
+        return {"posts": [{"title": "foo"}]}
+
+    @app.route("/stream_missing", output="template_stream", template="missing.html")
+    async def stream_missing():
+        return {}
+
+    client = app.test_client()
+    r = client.get("/stream")
+    assert r.status == 200
+    assert r.headers["content-type"] == "text/html; charset=utf-8"
+    assert "<h2>foo</h2>" in r.data
+    assert client.get("/stream_missing").status == 404
+
+
+@pytest.mark.asyncio
+async def test_render_async(app):
+    events = []
+
+    async def value(name, delay):
+        events.append(f"start:{name}")
+        await asyncio.sleep(delay)
+        events.append(f"end:{name}")
+        return name
+
+    templater = app.templater
+    source = "{{=a}} {{=b}} {{=c}}"
+    context = await templater.resolve_context({"a": value("a", 0.02), "b": value("b", 0), "c": "c"})
+    assert templater._render(source=source, context=context) == "a b c"
+    assert events == ["start:a", "end:a", "start:b", "end:b"]
+
+    events.clear()
+    context = await templater.resolve_context({"a": value("a", 0.02), "b": value("b", 0), "c": "c"}, concurrent=True)
+    assert templater._render(source=source, context=context) == "a b c"
+    assert events == ["start:a", "start:b", "end:b", "end:a"]
+
+
+def test_render_async_route(app, monkeypatch):
+    async def posts():
+        return [{"title": "foo"}]
+
+    app.config.templates_awaits = True
+
+    @app.route("/awaitables", template="test.html")
+    async def awaitables():
+        return {"posts": posts()}
+
+    app.config.templates_awaits = False
+
+    @app.route("/no_awaitables", template="test.html")
+    async def no_awaitables():
+        return {"posts": [{"title": "bar"}]}
+
+    r = app.test_client().get("/awaitables")
+    assert r.status == 200
+    assert "<h2>foo</h2>" in r.data
+
+    #: routes defined with awaitables disabled never inspect their context
+    async def resolve_context(*args, **kwargs):
+        raise AssertionError("context inspected")
+
+    monkeypatch.setattr(app.templater, "resolve_context", resolve_context)
+    r = app.test_client().get("/no_awaitables")
+    assert r.status == 200
+    assert "<h2>bar</h2>" in r.data
@@ -6,9 +6,13 @@ tests.wrappers
 Test Emmett wrappers module
 """
 
+import io
+
+import pytest
 from emmett_core.protocols.rsgi.test_client.scope import ScopeBuilder
 from helpers import current_ctx
 
+from emmett.http import HTTPRangeFileResponse, HTTPRangeIOResponse, parse_range
 from emmett.rsgi.wrappers import Request, Response
 
 
@@ -34,3 +38,142 @@ def test_req_ctx():
     with current_ctx("/?foo=bar") as ctx:
         assert isinstance(ctx.request, Request)
         assert isinstance(ctx.response, Response)
+
+
+def test_response_buffer():
+    class FakeProtocol:
+        def response_bytes(self, status, headers, body):
+            self.data = (status, dict(headers), body)
+
+    response = Response(None)
+    proto = FakeProtocol()
+    response.wrap_buffer(memoryview(b"payload")).rsgi(proto)
+
+    status, headers, body = proto.data
+    assert status == 200
+    assert headers["content-length"] == "7"
+    assert body == b"payload"
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("items=0-1", 100) is None
+    assert parse_range("bytes=5-2", 100) is None
+    assert parse_range("bytes=0-9", 100) == [(0, 10)]
+    assert parse_range("bytes=90-", 100) == [(90, 100)]
+    assert parse_range("bytes=-10", 100) == [(90, 100)]
+    assert parse_range("bytes=0-9, 5-19, 50-59", 100) == [(0, 20), (50, 60)]
+    assert parse_range("bytes=200-300", 100) == []
+    assert parse_range("bytes=" + ",".join(f"{idx}-{idx}" for idx in range(0, 40, 2)), 100) is None
+
+
+class FakeLegacyRangeProtocol:
+    def response_file(self, status, headers, file):
+        self.data = (status, dict(headers), file)
+
+    def response_bytes(self, status, headers, body):
+        self.data = (status, dict(headers), body)
+
+    def response_empty(self, status, headers):
+        self.data = (status, dict(headers), None)
+
+    def response_stream(self, status, headers):
+        protocol = self
+        self.data = (status, dict(headers), b"")
+
+        class Transport:
+            async def send_bytes(self, data):
+                status, headers, body = protocol.data
+                protocol.data = (status, headers, body + data)
+
+        return Transport()
+
+
+class FakeRangeProtocol(FakeLegacyRangeProtocol):
+    def response_file_range(self, status, headers, file, start, end):
+        self.data = (status, dict(headers), (file, start, end))
+
+
+@pytest.mark.asyncio
+async def test_response_file_ranges(tmp_path):
+    file_path = str(tmp_path / "data.bin")
+    with open(file_path, "wb") as f:
+        f.write(bytes(range(100)))
+    proto = FakeRangeProtocol()
+
+    HTTPRangeFileResponse(file_path).rsgi(proto)
+    status, headers, _ = proto.data
+    assert status == 200
+    assert headers["accept-ranges"] == "bytes"
+
+    HTTPRangeFileResponse(file_path, range_header="bytes=10-19").rsgi(proto)
+    status, headers, body = proto.data
+    assert status == 206
+    assert headers["content-range"] == "bytes 10-19/100"
+    assert headers["content-length"] == "10"
+    assert body == (file_path, 10, 20)
+
+    http = HTTPRangeFileResponse(file_path, range_header="bytes=0-1,-2")
+    await http.rsgi(proto)
+    status, headers, body = proto.data
+    boundary = headers["content-type"].split("boundary=")[1]
+    assert status == 206
+    assert headers["content-length"] == str(len(body))
+    assert body.startswith(f"--{boundary}\r\n".encode())
+    assert body.endswith(f"\r\n--{boundary}--\r\n".encode())
+    assert b"content-range: bytes 98-99/100\r\n\r\n\x62\x63" in body
+
+    HTTPRangeFileResponse(file_path, range_header="bytes=100-").rsgi(proto)
+    status, headers, _ = proto.data
+    assert status == 416
+    assert headers["content-range"] == "bytes */100"
+
+    HTTPRangeFileResponse(file_path, range_header="bytes=10-19", if_range='"stale"').rsgi(proto)
+    status, headers, _ = proto.data
+    assert status == 200
+    etag = headers["etag"]
+    HTTPRangeFileResponse(file_path, range_header="bytes=10-19", if_range=etag).rsgi(proto)
+    assert proto.data[0] == 206
+
+    proto = FakeLegacyRangeProtocol()
+    await HTTPRangeFileResponse(file_path, range_header="bytes=10-19").rsgi(proto)
+    status, headers, body = proto.data
+    assert status == 206
+    assert body == bytes(range(10, 20))
+
+
+@pytest.mark.asyncio
+async def test_response_io_ranges():
+    proto = FakeRangeProtocol()
+    await HTTPRangeIOResponse(io.BytesIO(b"0123456789"), range_header="bytes=2-4").rsgi(proto)
+    status, headers, body = proto.data
+    assert status == 206
+    assert headers["content-range"] == "bytes 2-4/10"
+    assert body == b"234"
+
+    await HTTPRangeIOResponse(io.BytesIO(b"0123456789"), chunk_size=4).rsgi(proto)
+    status, headers, body = proto.data
+    assert status == 200
+    assert headers["content-length"] == "10"
+    assert body == b"0123456789"
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await HTTPRangeIOResponse(io.BytesIO(b"0123456789"), range_header="bytes=-3").asgi({}, send)
+    assert messages[0]["status"] == 206
+    assert b"".join(message.get("body", b"") for message in messages[1:]) == b"789"
+
+
+@pytest.mark.asyncio
+async def test_response_file_ranges_missing(tmp_path):
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await HTTPRangeFileResponse(str(tmp_path / "missing.bin"), range_header="bytes=0-9").asgi({}, send)
+    assert messages[0]["status"] == 404
+    assert not messages[-1].get("more_body", False)